@@ -0,0 +1,265 @@
+"""
+Scale benchmark for utils.scheduler.MusicScheduler.
+
+Loads the scheduler with 10, 1k, 10k and 100k schedules spread across all
+weekdays, drives it with a fake player and writes the results as JSON so
+runs from different commits can be compared:
+
+    python benchmarks/bench_scheduler.py --output before.json
+    python benchmarks/bench_scheduler.py --output after.json --compare before.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.clock import SimulatedClock, SystemClock
+from utils.config import TIMER_MAX_WAIT
+from utils.scheduler import MusicScheduler, DAY_NAMES
+
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+LATENCY_PROBES = 50
+REMOVE_SAMPLE = 1000
+IDLE_WINDOW = 2.0
+IDLE_TIME_SCALE = 120     # Idle clock runs this much faster than real time
+
+
+class FakePlayer:
+    """Stands in for MusicPlayer and records when each fire reached it."""
+
+    def __init__(self):
+        self.fire_times = []
+        self._lock = threading.Lock()
+
+    def shuffle_and_play(self, stop_duration=0):
+        now = time.time()
+        with self._lock:
+            self.fire_times.append(now)
+
+    def stop(self):
+        pass
+
+
+def generate_schedules(count, seed=1234):
+    """Return `count` (time_str, days, stop_duration) tuples across the whole week."""
+    rng = random.Random(seed)
+    schedules = []
+    for _ in range(count):
+        time_str = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"
+        days = rng.sample(DAY_NAMES, rng.randint(1, len(DAY_NAMES)))
+        schedules.append((time_str, days, rng.choice([0, 15, 30, 60])))
+    return schedules
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def measure_add_remove(schedules):
+    """Time bulk add and per-job remove on a running scheduler."""
+    scheduler = MusicScheduler(FakePlayer())
+    scheduler.start()
+    try:
+        start = time.perf_counter()
+        job_ids = [scheduler.add_schedule(*schedule) for schedule in schedules]
+        add_seconds = time.perf_counter() - start
+
+        sample = random.Random(99).sample(job_ids, min(REMOVE_SAMPLE, len(job_ids)))
+        start = time.perf_counter()
+        for job_id in sample:
+            scheduler.remove_job(job_id)
+        remove_seconds = time.perf_counter() - start
+    finally:
+        scheduler.stop()
+
+    return {
+        'add_us_per_schedule': add_seconds / len(schedules) * 1e6,
+        'remove_us_per_schedule': remove_seconds / len(sample) * 1e6,
+    }
+
+
+def measure_memory(schedules):
+    """Bytes retained per schedule once everything is registered and queued."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    scheduler = MusicScheduler(FakePlayer(), clock=SimulatedClock())
+    for schedule in schedules:
+        scheduler.add_schedule(*schedule)
+    scheduler.start()  # queues every slot on the simulated clock
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {'bytes_per_schedule': (after - before) / len(schedules)}
+
+
+def measure_simulated_day(schedules):
+    """Fast-forward one day on a simulated clock and measure the scheduler's CPU cost."""
+    player = FakePlayer()
+    clock = SimulatedClock()
+    scheduler = MusicScheduler(player, clock=clock)
+    for schedule in schedules:
+        scheduler.add_schedule(*schedule)
+
+    scheduler.start()
+    cpu_start = time.process_time()
+    clock.advance(24 * 60 * 60)
+    cpu_seconds = time.process_time() - cpu_start
+    scheduler.stop()
+
+    return {
+        'cpu_seconds_per_day': cpu_seconds,
+        'fires_per_day': len(player.fire_times),
+        'wakeups_per_hour_simulated': scheduler.wakeups / 24,
+        'late_fires_per_day': scheduler.stats['late_fires'],
+        'missed_fires_per_day': scheduler.stats['missed_fires'],
+    }
+
+
+def measure_idle_wakeups(schedules, window=IDLE_WINDOW, time_scale=IDLE_TIME_SCALE):
+    """
+    Count real wakeups while nothing is due.
+
+    The shared clock thread re-checks the wall clock every TIMER_MAX_WAIT
+    seconds while a timer is pending; to see that within a short window it
+    runs on a private clock whose max wait is `time_scale` times shorter,
+    and its count is scaled back to real hours. Scheduler wakeups (fire
+    callbacks) are counted as they are.
+    """
+    clock = SystemClock(max_wait=TIMER_MAX_WAIT / time_scale)
+    scheduler = MusicScheduler(FakePlayer(), clock=clock)
+    for schedule in schedules:
+        scheduler.add_schedule(*schedule)
+    scheduler.start()
+    # Let the start-up arming settle before counting
+    time.sleep(0.1)
+    start_clock_wakeups = clock.wakeups
+    start_wakeups = scheduler.wakeups
+    time.sleep(window)
+    clock_wakeups = clock.wakeups - start_clock_wakeups
+    wakeups = scheduler.wakeups - start_wakeups
+    scheduler.stop()
+    return {
+        'wakeups_per_hour_idle': clock_wakeups * 3600 / (window * time_scale),
+        'fire_wakeups_per_hour_idle': wakeups * 3600 / window,
+    }
+
+
+def measure_fire_latency(schedules, probes=LATENCY_PROBES):
+    """Add probes for the next minute boundary and measure how late they fire."""
+    player = FakePlayer()
+    scheduler = MusicScheduler(player)
+    for schedule in schedules:
+        scheduler.add_schedule(*schedule)
+
+    target = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+    if (target - datetime.now()).total_seconds() < 2:
+        target += timedelta(minutes=1)
+    probe_time = target.strftime('%H:%M')
+    probe_day = DAY_NAMES[target.weekday()]
+    for _ in range(probes):
+        scheduler.add_schedule(probe_time, [probe_day])
+
+    scheduler.start()
+    time.sleep((target - datetime.now()).total_seconds() + 1.0)
+    scheduler.stop()
+
+    stats = scheduler.get_stats()
+    target_ts = target.timestamp()
+    latencies = [(fired - target_ts) * 1000 for fired in player.fire_times
+                 if 0 <= fired - target_ts < 60]
+    return {
+        'fire_latency_ms_p50': percentile(latencies, 0.50),
+        'fire_latency_ms_p99': percentile(latencies, 0.99),
+        'fire_latency_ms_max': max(latencies) if latencies else None,
+        'fire_latency_samples': len(latencies),
+        'scheduler_max_latency_ms': stats['max_latency'] * 1000,
+    }
+
+
+def run(sizes, skip_latency=False):
+    results = {}
+    for size in sizes:
+        print(f"BENCHMARK: {size} schedules", file=sys.stderr)
+        schedules = generate_schedules(size)
+        result = {}
+        result.update(measure_add_remove(schedules))
+        result.update(measure_memory(schedules))
+        result.update(measure_simulated_day(schedules))
+        result.update(measure_idle_wakeups(schedules))
+        if not skip_latency:
+            result.update(measure_fire_latency(schedules))
+        results[str(size)] = result
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print the relative change of every metric against a previous run."""
+    for size, metrics in results.items():
+        previous = baseline.get('results', {}).get(size)
+        if not previous:
+            continue
+        print(f"{size} schedules:")
+        for name, value in metrics.items():
+            old = previous.get(name)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                print(f"  {name}: {old:.3f} -> {value:.3f} ({(value - old) / old * 100:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MusicScheduler scale benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="schedule counts to benchmark")
+    parser.add_argument('--output', default='bench_scheduler.json',
+                        help="where to write the JSON results")
+    parser.add_argument('--compare', metavar='JSON',
+                        help="previous results file to compare against")
+    parser.add_argument('--skip-latency', action='store_true',
+                        help="skip the real-time fire latency run (waits for a minute boundary per size)")
+    args = parser.parse_args(argv)
+
+    report = {
+        'benchmark': 'scheduler',
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': run(args.sizes, args.skip_latency),
+    }
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    print(json.dumps(report['results'], indent=4))
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report['results'], json.load(f))
+
+
+if __name__ == "__main__":
+    main()
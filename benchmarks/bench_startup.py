@@ -0,0 +1,159 @@
+"""
+Startup time benchmark.
+
+Launches the app with --profile-startup a number of times and reports
+how long each startup phase took, plus the wall time from launching the
+process to the app being up (which also covers interpreter start). The
+headless service is measured by default; --gui measures the window
+instead (needs a display, and uses the app's own settings.json).
+
+    python benchmarks/bench_startup.py --tracks 20000 --budget 1.5
+
+A fresh music folder and settings file are generated for the run. The
+first launch scans the folder; the ones after it start from the saved
+library index, as a real restart would. With --budget the script exits
+with status 1 when the median startup is over budget.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from utils.library import cache_path
+
+DEFAULT_RUNS = 5
+TRACKS_PER_DIR = 200
+
+
+def make_library(folder, tracks):
+    """Fill `folder` with `tracks` empty .mp3 files in subfolders."""
+    for index in range(tracks):
+        directory = os.path.join(folder, f"album{index // TRACKS_PER_DIR:04d}")
+        if index % TRACKS_PER_DIR == 0:
+            os.makedirs(directory)
+        open(os.path.join(directory, f"track{index:06d}.mp3"), 'wb').close()
+
+
+def make_settings(path, music_folder, schedules):
+    days = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday']
+    settings = {
+        'music_folder': music_folder,
+        'volume': 0.7,
+        'schedules': [{'time': f"{(index // 60) % 24:02d}:{index % 60:02d}", 'days': days,
+                       'stop_duration': 15} for index in range(schedules)],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(settings, f)
+
+
+def launch(command):
+    """Run the app once; return (wall seconds until it reported, its phase report)."""
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True)
+    report = None
+    for line in process.stdout:
+        if line.startswith('{'):
+            report = json.loads(line)
+            break
+    wall = time.perf_counter() - started
+    process.stdout.close()
+    process.wait()
+    if report is None:
+        raise RuntimeError(f"{' '.join(command)} exited with status {process.returncode} without a report")
+    return wall, report
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def run(runs, tracks, schedules, gui=False):
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    try:
+        music_folder = os.path.join(workdir, 'music')
+        os.makedirs(music_folder)
+        make_library(music_folder, tracks)
+        settings_file = os.path.join(workdir, 'settings.json')
+        make_settings(settings_file, music_folder, schedules)
+
+        command = [sys.executable, os.path.join(ROOT, 'main.py'), '--profile-startup']
+        if not gui:
+            command += ['--headless', '--settings', settings_file, '--log-file', '']
+
+        # The first launch builds the library index; it is reported separately
+        cold_wall, cold = launch(command)
+        walls, phases = [], {}
+        for _ in range(runs):
+            wall, report = launch(command)
+            walls.append(wall)
+            for entry in report['phases']:
+                phases.setdefault(entry['phase'], []).append(entry['seconds'])
+
+        return {
+            'first_launch': cold_wall,
+            'first_launch_phases': {entry['phase']: entry['seconds'] for entry in cold['phases']},
+            'wall': median(walls),
+            'wall_max': max(walls),
+            'phases': {phase: median(values) for phase, values in phases.items()},
+        }
+    finally:
+        # The app keeps its index and history of the folder in its own cache
+        for kind in ('library', 'history'):
+            try:
+                os.remove(cache_path(music_folder, kind))
+            except OSError:
+                pass
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Music scheduler startup benchmark")
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help="launches to take the median of")
+    parser.add_argument('--tracks', type=int, default=5000, help="tracks in the generated music folder")
+    parser.add_argument('--schedules', type=int, default=50, help="schedules in the generated settings")
+    parser.add_argument('--gui', action='store_true', help="measure the window instead of the headless service")
+    parser.add_argument('--budget', type=float, metavar='SECONDS',
+                        help="fail when the median startup takes longer")
+    parser.add_argument('--output', default='bench_startup.json', help="where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    results = run(args.runs, args.tracks, args.schedules, args.gui)
+    report = {
+        'benchmark': 'startup',
+        'mode': 'gui' if args.gui else 'headless',
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'tracks': args.tracks,
+        'schedules': args.schedules,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+
+    for phase, seconds in results['phases'].items():
+        print(f"{phase:>15}: {seconds * 1000:8.1f} ms")
+    print(f"{'wall':>15}: {results['wall'] * 1000:8.1f} ms (max {results['wall_max'] * 1000:.1f} ms, "
+          f"first launch {results['first_launch'] * 1000:.1f} ms)")
+
+    if args.budget is not None and results['wall'] > args.budget:
+        print(f"Startup is over budget: {results['wall']:.3f}s > {args.budget:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,24 @@
-from ui.main_window import main
+import multiprocessing
+import sys
+
+from utils import startup
+from utils.config import LOG_FILE
+from utils.log import setup_logging
 
 if __name__ == "__main__":
-    main()
+    # Process pools (track analysis, zones) re-run this file in frozen builds
+    multiprocessing.freeze_support()
+    startup.mark('imports')
+
+    if '--headless' in sys.argv[1:]:
+        # No GUI: tkinter is never imported
+        from utils.daemon import main as run_headless
+        startup.mark('daemon-imports')
+        run_headless(sys.argv[1:])
+    else:
+        from ui.main_window import main
+
+        # Windowed builds have no console; keep a log file instead
+        setup_logging(log_file=LOG_FILE if sys.stderr is None else None)
+        startup.mark('ui-imports')
+        main(profile_startup='--profile-startup' in sys.argv[1:])
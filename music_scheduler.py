@@ -3,12 +3,21 @@ from tkinter import ttk, filedialog, messagebox, Scale
 import schedule
 import time
 import os
-import pygame
-import random
 from datetime import datetime
 import json
+import multiprocessing
+import sys
 from threading import Thread
 
+from utils.config import LOG_FILE
+from utils.library import get_library
+from utils.log import get_logger, setup_logging
+from utils.music_player import MusicPlayer
+from utils.settings import SettingsWriter
+from ui.ui_bridge import UIBridge
+
+log = get_logger('legacy')
+
 class MusicSchedulerApp:
     def __init__(self, root):
         self.root = root
@@ -105,15 +114,24 @@ class MusicSchedulerApp:
             'activebackground': '#6C63FF'
         }
 
-        # אתחול pygame למוזיקה
-        pygame.mixer.init()
-        print("Pygame mixer initialized")
+        # הנגן מנגן ברקע ועובר לשיר הבא בעצמו; הכרטיס נפתח בניגון הראשון
+        self.player = MusicPlayer(volume=0.7)
+        self.player.on_track_start = self._on_track_start
         
         # משתנים לשמירת הבחירות
         self.music_folder = ""
         self.selected_days = []
         self.schedules = []
         
+        # מתזמן פרטי למופע הזה (לא המתזמן הגלובלי של המודול schedule)
+        self.scheduler = schedule.Scheduler()
+        self.schedule_jobs = []
+        # שמירה אטומית ברקע, כך שקריסה באמצע כתיבה לא תשחית את הקובץ
+        self.settings_writer = SettingsWriter('music_scheduler_settings.json')
+        # תהליכונים ברקע לא נוגעים בווידג'טים; הם שולחים עדכונים דרך הגשר
+        self.ui = UIBridge(root)
+        self.ui.start()
+        
         # עדכון הסגנונות
         style = ttk.Style()
         
@@ -523,15 +541,8 @@ class MusicSchedulerApp:
             return
             
         try:
-            music_files = [f for f in os.listdir(self.music_folder) 
-                          if f.endswith(('.mp3', '.wav'))]
-            if music_files:
-                music_file = os.path.join(self.music_folder, random.choice(music_files))
-                print(f"Playing test file: {music_file}")
-                pygame.mixer.music.load(music_file)
-                pygame.mixer.music.play()
-                self.status_label.config(text=f"מנגן: {os.path.basename(music_file)}")
-            else:
+            log.info("Test play of %s", self.music_folder)
+            if not self.play_next_song(self.music_folder):
                 messagebox.showerror("שגיאה", "לא נמצאו קבצי מוזיקה בתיקייה")
         except Exception as e:
             messagebox.showerror("שגיאה", f"שגיאה בהפעלת המוזיקה: {str(e)}")
@@ -541,10 +552,12 @@ class MusicSchedulerApp:
         if folder:
             self.music_folder = folder
             self.folder_label.config(text=self.music_folder)
-            print(f"Selected folder: {folder}")
+            log.info("Selected folder: %s", folder)
             # בדיקת קבצי מוזיקה בתיקייה
-            music_files = [f for f in os.listdir(folder) if f.endswith(('.mp3', '.wav'))]
-            print(f"Found {len(music_files)} music files")
+            try:
+                log.info("Found %d music files", len(get_library(folder)))
+            except (OSError, ValueError) as e:
+                log.warning("Could not index %s: %s", folder, e)
 
     def add_schedule(self):
         if not self.music_folder:
@@ -564,7 +577,7 @@ class MusicSchedulerApp:
             'volume': self.volume_var.get()  # Add volume to the schedule info
         }
         
-        print(f"Adding schedule: {schedule_info}")
+        log.info("Adding schedule: %s", schedule_info)
         self.schedules.append(schedule_info)
         self.update_schedule_display()
         self.setup_schedule(schedule_info)
@@ -582,19 +595,16 @@ class MusicSchedulerApp:
         if selection:
             index = selection[0]
             del self.schedules[index]
+            # Cancel only the job belonging to this schedule
+            self.scheduler.cancel_job(self.schedule_jobs.pop(index))
             self.update_schedule_display()
             self.save_settings()
 
     def save_settings(self):
         settings = {
-            'schedules': self.schedules
+            'schedules': list(self.schedules)
         }
-        try:
-            with open('music_scheduler_settings.json', 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False)
-            print("Settings saved successfully")
-        except Exception as e:
-            messagebox.showerror("שגיאה", f"שגיאה בשמירת ההגדרות: {str(e)}")
+        self.settings_writer.save(settings)
 
     def load_settings(self):
         try:
@@ -604,62 +614,56 @@ class MusicSchedulerApp:
                 self.update_schedule_display()
                 for schedule_info in self.schedules:
                     self.setup_schedule(schedule_info)
-            print("Settings loaded successfully")
+            log.info("Settings loaded successfully")
         except FileNotFoundError:
-            print("No settings file found")
+            log.info("No settings file found")
         except Exception as e:
             messagebox.showerror("שגיאה", f"שגיאה בטעינת ההגדרות: {str(e)}")
 
     def setup_schedule(self, schedule_info):
         def play_music():
             current_day = datetime.now().strftime('%A')
-            print(f"Current day: {current_day}")
-            print(f"Scheduled days: {schedule_info['days']}")
+            log.debug("Current day: %s, scheduled days: %s", current_day, schedule_info['days'])
             if current_day in schedule_info['days']:
                 try:
                     # Set the volume for this schedule
                     volume = schedule_info.get('volume', 0.7)  # Default to 0.7 if not set
-                    pygame.mixer.music.set_volume(volume)
+                    self.player.set_volume(volume)
                     
-                    music_files = [f for f in os.listdir(schedule_info['folder']) 
-                                 if f.endswith(('.mp3', '.wav'))]
-                    print(f"Found {len(music_files)} music files")
-                    if music_files:
-                        self.music_files = music_files
-                        self.current_music_index = 0
-                        self.play_next_song(schedule_info['folder'])
-                    else:
-                        print("No music files found")
-                        self.status_label.config(text="לא נמצאו קבצי מוזיקה")
+                    # Returns at once; the scheduler thread is free for the next schedules
+                    if not self.play_next_song(schedule_info['folder']):
+                        log.warning("No music files found")
+                        self.ui.config(self.status_label, text="לא נמצאו קבצי מוזיקה")
                 except Exception as e:
-                    print(f"Error playing music: {str(e)}")
-                    self.status_label.config(text=f"שגיאה: {str(e)}")
+                    log.error("Error playing music: %s", e)
+                    self.ui.config(self.status_label, text=f"שגיאה: {str(e)}")
             else:
-                print("Not scheduled for today")
+                log.debug("Not scheduled for today")
         
-        print(f"Setting up schedule for {schedule_info['time']}")
-        schedule.every().day.at(schedule_info['time']).do(play_music)
+        log.info("Setting up schedule for %s", schedule_info['time'])
+        job = self.scheduler.every().day.at(schedule_info['time']).do(play_music)
+        self.schedule_jobs.append(job)
 
     def run_scheduler(self):
         while True:
             try:
                 current_time = datetime.now().strftime('%H:%M')
-                schedule.run_pending()
-                self.debug_label.config(text=f"זמן נוכחי: {current_time}")
+                self.scheduler.run_pending()
+                self.ui.config(self.debug_label, text=f"זמן נוכחי: {current_time}")
                 time.sleep(1)
             except Exception as e:
-                print(f"Error in scheduler: {str(e)}")
-                self.debug_label.config(text=f"שגיאה: {str(e)}")
+                log.error("Error in scheduler: %s", e)
+                self.ui.config(self.debug_label, text=f"שגיאה: {str(e)}")
 
     def stop_music(self):
         """Function to stop the music"""
-        pygame.mixer.music.stop()
+        self.player.stop()
         self.status_label.config(text="המוזיקה הופסקה")
 
     def update_volume(self, *args):
         """עדכון תווית הווליום והעוצמה"""
         volume = self.volume_var.get()
-        pygame.mixer.music.set_volume(volume)
+        self.player.set_volume(volume)
         self.volume_label.config(text=f"{int(volume * 100)}%")
 
     def shuffle_and_play(self):
@@ -669,36 +673,29 @@ class MusicSchedulerApp:
             return
             
         try:
-            music_files = [f for f in os.listdir(self.music_folder) 
-                          if f.endswith(('.mp3', '.wav'))]
-            if music_files:
-                random.shuffle(music_files)
-                self.music_files = music_files
-                self.current_music_index = 0
-                self.play_next_song(self.music_folder)
-            else:
+            if not self.play_next_song(self.music_folder):
                 messagebox.showerror("שגיאה", "לא נמצאו קבצי מוזיקה בתיקייה")
         except Exception as e:
             messagebox.showerror("שגיאה", f"שגיאה בהפעלת המוזיקה: {str(e)}")
 
     def play_next_song(self, folder):
-        """Function to play the next song in the list"""
-        if self.current_music_index < len(self.music_files):
-            music_file = os.path.join(folder, self.music_files[self.current_music_index])
-            pygame.mixer.music.load(music_file)
-            pygame.mixer.music.play()
-            self.status_label.config(text=f"מנגן: {os.path.basename(music_file)}")
-            self.current_music_index += 1
-            pygame.mixer.music.set_endevent(pygame.USEREVENT)
-            pygame.event.clear()
-            while True:
-                for event in pygame.event.get():
-                    if event.type == pygame.USEREVENT:
-                        self.play_next_song(folder)
-                        return
-                time.sleep(0.1)
-        else:
-            self.status_label.config(text="סיימנו לנגן את כל השירים")
+        """
+        Start shuffled playback of a folder and return at once.
+
+        The player moves on to the next song by itself when one ends, so
+        nothing waits here. Returns False if the folder has no songs.
+        """
+        if self.player.library is None or self.player.library.root != os.path.abspath(folder):
+            self.player.load_playlist(folder)
+        if not len(self.player.playlist):
+            self.ui.config(self.status_label, text="לא נמצאו קבצי מוזיקה")
+            return False
+        self.player.shuffle_and_play()
+        return True
+
+    def _on_track_start(self, path):
+        """Player callback (from its thread): show the song that started."""
+        self.ui.config(self.status_label, text=f"מנגן: {os.path.basename(path)}")
 
     def update_day_selection(self, day):
         """עדכון חיווי ויזואלי לבחירת יום"""
@@ -713,6 +710,8 @@ class MusicSchedulerApp:
             self.status_label.config(text="לא נבחרו ימים")
 
 def main():
+    # Windowed builds have no console; keep a log file instead
+    setup_logging(log_file=LOG_FILE if sys.stderr is None else None)
     root = tk.Tk()
     app = MusicSchedulerApp(root)
     
@@ -720,7 +719,16 @@ def main():
     scheduler_thread = Thread(target=app.run_scheduler, daemon=True)
     scheduler_thread.start()
     
+    def on_closing():
+        app.player.stop()
+        app.ui.stop()
+        app.settings_writer.close()
+        root.destroy()
+    
+    root.protocol("WM_DELETE_WINDOW", on_closing)
     root.mainloop()
 
 if __name__ == "__main__":
+    # Track analysis runs in process pools; in the frozen exe each worker re-runs this file
+    multiprocessing.freeze_support()
     main()
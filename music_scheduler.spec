@@ -1,4 +1,7 @@
 # -*- mode: python ; coding: utf-8 -*-
+# One-folder build: a one-file build unpacks itself to a temp folder on
+# every launch, which dominates startup on slow disks. UPX is off for the
+# same reason (every DLL would be decompressed at load).
 
 
 a = Analysis(
@@ -19,16 +22,13 @@ pyz = PYZ(a.pure)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='music_scheduler',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +36,12 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='music_scheduler',
+)
@@ -0,0 +1,83 @@
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+from utils.clock import SimulatedClock, SystemClock
+from utils.music_player import MusicPlayer
+from utils.simulation import SimulatedBackend
+
+
+class SimulatedClockTest(unittest.TestCase):
+    def test_call_later_ignores_clock_steps(self):
+        clock = SimulatedClock(datetime(2024, 1, 1, 8, 0))
+        fired = []
+        clock.call_later(600, lambda: fired.append(clock.now()))
+        clock.jump(3600)
+        clock.advance(599)
+        self.assertEqual(fired, [])
+        clock.advance(1)
+        self.assertEqual(fired, [datetime(2024, 1, 1, 9, 10)])
+
+    def test_call_at_follows_clock_steps(self):
+        clock = SimulatedClock(datetime(2024, 1, 1, 8, 0))
+        fired = []
+        clock.call_at(datetime(2024, 1, 1, 8, 30), lambda: fired.append(clock.now()))
+        clock.jump(3600)
+        self.assertEqual(fired, [datetime(2024, 1, 1, 9, 0)])
+
+    def test_timers_run_in_order(self):
+        clock = SimulatedClock(datetime(2024, 1, 1))
+        fired = []
+        clock.call_later(30, lambda: fired.append('later 30'))
+        clock.call_at(datetime(2024, 1, 1, 0, 0, 20), lambda: fired.append('at 20'))
+        clock.call_later(10, lambda: fired.append('later 10'))
+        clock.call_later(40, lambda: fired.append('cancelled')).cancel()
+        clock.advance(60)
+        self.assertEqual(fired, ['later 10', 'at 20', 'later 30'])
+
+    def test_stop_duration_lasts_its_length_across_a_step(self):
+        for step in (10 * 60, -10 * 60):
+            with self.subTest(step=step):
+                clock = SimulatedClock(datetime(2024, 1, 1, 8, 0))
+                player = MusicPlayer(clock=clock, backend=SimulatedBackend(clock), seed=0,
+                                     track_duration=lambda path: None, track_gain=lambda path: 1.0)
+                player.set_playlist([f"{i}.mp3" for i in range(5)])
+                player.shuffle_and_play(stop_duration=30)
+                clock.advance(5 * 60)
+                clock.jump(step)
+                clock.advance(2 * 60 * 60)
+                stops = [when for when, event, _ in clock.events if event == 'stop']
+                self.assertEqual(stops, [datetime(2024, 1, 1, 8, 30) + timedelta(seconds=step)])
+
+
+class SystemClockTest(unittest.TestCase):
+    def test_call_at_and_call_later_run_in_order(self):
+        clock = SystemClock()
+        done = threading.Event()
+        fired = []
+        clock.call_later(0.1, lambda: fired.append('later'))
+        clock.call_later(0.15, done.set)
+        clock.call_at(datetime.now() + timedelta(seconds=0.05), lambda: fired.append('at'))
+        self.assertTrue(done.wait(5))
+        self.assertEqual(fired, ['at', 'later'])
+
+    def test_call_later_sleeps_until_due(self):
+        # max_wait only bounds the sleep while a call_at() timer is pending
+        clock = SystemClock(max_wait=0.001)
+        done = threading.Event()
+        clock.call_later(0.2, done.set)
+        self.assertTrue(done.wait(5))
+        self.assertLess(clock.wakeups, 5)
+
+    def test_cancel(self):
+        clock = SystemClock()
+        done = threading.Event()
+        fired = []
+        clock.call_later(0.02, lambda: fired.append('cancelled')).cancel()
+        clock.call_later(0.05, done.set)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(fired, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
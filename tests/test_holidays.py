@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from utils.holidays import REPLACE, SKIP, CalendarException, ExceptionCalendar
+from utils.simulation import simulate
+
+
+class ExceptionCalendarTest(unittest.TestCase):
+    def test_later_exception_wins_where_ranges_overlap(self):
+        calendar = ExceptionCalendar([
+            CalendarException(date(2026, 10, 1), date(2026, 10, 31), SKIP, name='October'),
+            CalendarException(date(2026, 10, 10), date(2026, 10, 12), REPLACE, 'exams', name='Exams'),
+        ])
+        self.assertEqual(calendar.active_group(date(2026, 10, 9)), SKIP)
+        self.assertEqual(calendar.active_group(date(2026, 10, 10)), 'exams')
+        self.assertEqual(calendar.active_group(date(2026, 10, 12)), 'exams')
+        self.assertEqual(calendar.active_group(date(2026, 10, 13)), SKIP)
+        self.assertIsNone(calendar.active_group(date(2026, 11, 1)))
+
+    def test_earlier_exception_is_hidden_by_a_later_covering_one(self):
+        calendar = ExceptionCalendar([
+            CalendarException(date(2026, 10, 10), date(2026, 10, 12), REPLACE, 'exams', name='Exams'),
+            CalendarException(date(2026, 10, 1), date(2026, 10, 31), SKIP, name='October'),
+        ])
+        for day in (1, 10, 11, 12, 31):
+            self.assertEqual(calendar.lookup(date(2026, 10, day)).name, 'October')
+
+    def test_ranges_are_inclusive(self):
+        calendar = ExceptionCalendar([CalendarException(date(2026, 4, 1), date(2026, 4, 3))])
+        self.assertIsNone(calendar.lookup(date(2026, 3, 31)))
+        self.assertIsNotNone(calendar.lookup(date(2026, 4, 1)))
+        self.assertIsNotNone(calendar.lookup(date(2026, 4, 3)))
+        self.assertIsNone(calendar.lookup(date(2026, 4, 4)))
+
+    def test_replace_needs_a_group(self):
+        with self.assertRaises(ValueError):
+            CalendarException(date(2026, 4, 1), date(2026, 4, 3), REPLACE)
+
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'exceptions.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'exceptions': [{'name': 'סוכות', 'start': '2026-10-06', 'end': '2026-10-13'}]}, f)
+            calendar = ExceptionCalendar.load(path)
+        self.assertEqual(len(calendar), 1)
+        self.assertEqual(calendar.lookup(date(2026, 10, 7)).name, 'סוכות')
+
+
+class CalendarSchedulingTest(unittest.TestCase):
+    def test_exceptions_skip_and_replace_fires(self):
+        # Monday 2026-10-05 to Sunday 2026-10-11
+        calendar = ExceptionCalendar([
+            CalendarException(date(2026, 10, 6), date(2026, 10, 9), SKIP, name='Holiday'),
+            CalendarException(date(2026, 10, 8), date(2026, 10, 8), REPLACE, 'assembly', name='Assembly'),
+        ])
+        schedules = [
+            {'time': '08:00', 'days': [], 'stop_duration': 10},
+            {'time': '10:00', 'days': [], 'stop_duration': 10, 'group': 'assembly'},
+        ]
+        events = simulate(schedules, ['a.mp3', 'b.mp3'], days=7, start=datetime(2026, 10, 5),
+                          calendar=calendar)
+        fires = [(when.day, details['time']) for when, event, details in events if event == 'fire']
+        self.assertEqual(fires, [(5, '08:00'), (8, '10:00'), (10, '08:00'), (11, '08:00')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import threading
+import time
+import unittest
+from datetime import datetime
+
+from utils.clock import SimulatedClock
+from utils.music_player import MusicPlayer
+from utils.scheduler import MusicScheduler
+from utils.simulation import SimulatedBackend
+
+TRACKS = [f"{i:02d}.mp3" for i in range(10)]
+
+
+class SlowLoadPlayer(MusicPlayer):
+    """A player whose folder takes until `release` is set to load."""
+
+    def __init__(self, clock):
+        backend = SimulatedBackend(clock)
+        super().__init__(clock=clock, backend=backend, seed=0, track_duration=lambda path: 180.0,
+                         track_gain=lambda path: 1.0)
+        self.release = threading.Event()
+
+    def load_playlist(self, music_folder, background=False):
+        if background:
+            return super().load_playlist(music_folder, background=True)
+        self.release.wait(5)
+        self.set_playlist(TRACKS)
+
+
+class BackgroundLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = SimulatedClock(datetime(2024, 1, 1, 7, 59))
+        self.player = SlowLoadPlayer(self.clock)
+        self.scheduler = MusicScheduler(self.player, clock=self.clock)
+        self.scheduler.add_schedule('08:00', stop_duration=30)
+        self.player.load_playlist('music', background=True)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.player.release.set()
+        self.scheduler.stop()
+        self.player.stop()
+
+    def events(self, name):
+        return [when for when, event, _ in self.clock.events if event == name]
+
+    def wait_for_event(self, name):
+        deadline = time.monotonic() + 5
+        while not self.events(name) and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def test_fire_during_load_does_not_block_the_timer(self):
+        started = time.monotonic()
+        self.clock.advance(2 * 60)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(self.events('fire'), [datetime(2024, 1, 1, 8, 0)])
+        self.assertEqual(self.events('track_start'), [])
+
+        # Loaded at 08:07: playback starts then and still ends with the 08:00-08:30 window
+        self.clock.advance(6 * 60)
+        self.player.release.set()
+        self.wait_for_event('track_start')
+        self.assertEqual(self.events('track_start'), [datetime(2024, 1, 1, 8, 7)])
+        self.clock.advance(30 * 60)
+        self.assertEqual(self.events('stop'), [datetime(2024, 1, 1, 8, 30)])
+
+    def test_stop_cancels_a_pending_start(self):
+        self.clock.advance(2 * 60)
+        self.player.stop()
+        self.player.release.set()
+        self.player._loaded.wait(5)
+        time.sleep(0.01)
+        self.assertEqual(self.events('track_start'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from utils.config import PLAN_TOLERANCE_SECONDS
+from utils.planner import plan_window
+from utils.simulation import simulate
+
+START = datetime(2024, 1, 1)
+FIRE_AT = START.replace(hour=8)
+
+
+def run_window(durations, stop_duration, seed=0):
+    """Simulate one Monday 08:00 fire; return its (time, track) starts and the stop time."""
+    events = simulate([{'time': '08:00', 'days': ['Monday'], 'stop_duration': stop_duration}],
+                      list(durations), days=1, start=START, seed=seed, durations=durations)
+    starts = [(when, details['track']) for when, event, details in events if event == 'track_start']
+    stops = [when for when, event, _ in events if event == 'stop']
+    return starts, stops
+
+
+class PlanWindowTest(unittest.TestCase):
+    def test_fills_window_without_overrunning(self):
+        rng = random.Random(1)
+        candidates = [(f"{i}.mp3", rng.uniform(120, 360)) for i in range(500)]
+        plan = plan_window(candidates, 3600, random.Random(2))
+
+        self.assertLessEqual(plan.total, 3600)
+        self.assertLess(plan.shortfall, PLAN_TOLERANCE_SECONDS)
+        self.assertEqual(len(set(plan.tracks)), len(plan.tracks))
+        durations = dict(candidates)
+        self.assertAlmostEqual(sum(durations[track] for track in plan.tracks), plan.total)
+
+    def test_short_library_leaves_a_shortfall(self):
+        plan = plan_window([('a', 200), ('b', 250), ('c', 300)], 3600, random.Random(0))
+        self.assertEqual(sorted(plan.tracks), ['a', 'b', 'c'])
+        self.assertEqual(plan.shortfall, 3600 - 750)
+
+    def test_nothing_fits(self):
+        self.assertIsNone(plan_window([('long', 4000)], 3600, random.Random(0)))
+
+
+class StopDurationSimulationTest(unittest.TestCase):
+    def assert_back_to_back(self, starts, durations):
+        """Each track starts as the previous one ends."""
+        self.assertEqual(starts[0][0], FIRE_AT)
+        for (when, track), (next_when, _) in zip(starts, starts[1:]):
+            self.assertEqual(next_when, when + timedelta(seconds=durations[track]))
+
+    def test_planned_session_ends_with_its_last_song(self):
+        rng = random.Random(3)
+        durations = {f"{i:03d}.mp3": rng.uniform(150, 300) for i in range(200)}
+        stop_at = FIRE_AT + timedelta(minutes=45)
+        for seed in range(40):
+            with self.subTest(seed=seed):
+                starts, stops = run_window(durations, 45, seed)
+                self.assert_back_to_back(starts, durations)
+                tracks = [track for _, track in starts]
+                self.assertEqual(len(set(tracks)), len(tracks))
+
+                # Nothing starts after the last planned song, which is never cut off
+                last_when, last_track = starts[-1]
+                last_end = last_when + timedelta(seconds=durations[last_track])
+                self.assertLessEqual(last_end, stop_at)
+                self.assertLess(stop_at - last_end, timedelta(seconds=PLAN_TOLERANCE_SECONDS))
+                self.assertEqual(stops, [last_end])
+
+    def test_library_shorter_than_window_keeps_playing(self):
+        durations = {'a.mp3': 200, 'b.mp3': 250, 'c.mp3': 300}
+        starts, stops = run_window(durations, 60)
+        stop_at = FIRE_AT + timedelta(minutes=60)
+
+        # No plan fills the window, so songs repeat until the stop timer ends the session
+        self.assertGreater(len(starts), 3)
+        self.assert_back_to_back(starts, durations)
+        self.assertLess(starts[-1][0], stop_at)
+        self.assertEqual(stops, [stop_at])
+
+
+if __name__ == '__main__':
+    unittest.main()
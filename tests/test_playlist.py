@@ -0,0 +1,65 @@
+import random
+import unittest
+
+from utils.playlist import PlayHistory, Playlist, ShuffleOrder
+
+
+class ShuffleOrderTest(unittest.TestCase):
+    def draw(self, order, count):
+        return [order.next() for _ in range(count)]
+
+    def test_no_repeats_within_a_round(self):
+        playlist = Playlist(f"/music/{i}.mp3" for i in range(100))
+        order = ShuffleOrder(playlist, random.Random(0))
+        for _ in range(3):
+            self.assertEqual(sorted(self.draw(order, 100)), list(range(100)))
+
+    def test_removed_tracks_are_skipped(self):
+        playlist = Playlist(f"/music/{i}.mp3" for i in range(20))
+        order = ShuffleOrder(playlist, random.Random(0))
+        drawn = self.draw(order, 5)
+        removed = playlist.remove([f"/music/{i}.mp3" for i in range(10, 20)])
+        drawn += self.draw(order, 5)
+
+        self.assertEqual(len(set(drawn)), 10)
+        self.assertFalse(set(drawn[5:]) & set(removed))
+
+    def test_added_tracks_join_the_current_round(self):
+        playlist = Playlist(f"/music/{i}.mp3" for i in range(10))
+        order = ShuffleOrder(playlist, random.Random(0))
+        drawn = self.draw(order, 4)
+        playlist.add(f"/music/new{i}.mp3" for i in range(5))
+        drawn += self.draw(order, 11)
+        self.assertEqual(sorted(drawn), list(range(15)))
+
+    def test_empty_playlist(self):
+        self.assertIsNone(ShuffleOrder(Playlist(), random.Random(0)).next())
+
+
+class PlaylistTest(unittest.TestCase):
+    def test_remove_and_compact(self):
+        playlist = Playlist(['/a/1.mp3', '/a/2.mp3', '/b/1.mp3'])
+        self.assertEqual(playlist.remove(['/a/2.mp3', '/c/1.mp3']), [1])
+        self.assertEqual(playlist.remove(['/a/2.mp3']), [])
+        self.assertEqual(len(playlist), 2)
+
+        playlist.compact()
+        self.assertEqual(playlist.capacity, 2)
+        self.assertEqual(playlist.paths(), ['/a/1.mp3', '/b/1.mp3'])
+        self.assertEqual(playlist.remove(['/b/1.mp3']), [1])
+        self.assertEqual(playlist.paths(), ['/a/1.mp3'])
+
+
+class PlayHistoryTest(unittest.TestCase):
+    def test_keeps_the_most_recent(self):
+        history = PlayHistory(3)
+        for path in ('a', 'b', 'a', 'c', 'd'):
+            history.add(path)
+        self.assertEqual(len(history), 3)
+        self.assertIn('a', history)
+        self.assertNotIn('b', history)
+        self.assertIn('d', history)
+
+
+if __name__ == '__main__':
+    unittest.main()
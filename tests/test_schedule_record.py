@@ -0,0 +1,55 @@
+import unittest
+
+from utils.scheduler import ALL_DAYS, HEBREW_DAY_NAMES, ScheduleRecord, parse_days, parse_time
+
+
+class ParseDaysTest(unittest.TestCase):
+    def test_hebrew_names(self):
+        self.assertEqual(parse_days(['ראשון']), 1 << 6)
+        self.assertEqual(parse_days(['שני', 'שבת']), 1 << 0 | 1 << 5)
+
+    def test_hebrew_names_with_prefix(self):
+        self.assertEqual(parse_days(['יום ראשון', 'יום שלישי']), 1 << 6 | 1 << 1)
+
+    def test_english_names_any_case(self):
+        self.assertEqual(parse_days(['monday', 'TUE', ' Friday ']), 1 << 0 | 1 << 1 | 1 << 4)
+
+    def test_mixed_languages_and_numbers(self):
+        self.assertEqual(parse_days(['Sunday', 'ראשון', 6]), 1 << 6)
+
+    def test_empty_means_every_day(self):
+        self.assertEqual(parse_days([]), ALL_DAYS)
+        self.assertEqual(parse_days(None), ALL_DAYS)
+
+    def test_unknown_days_are_ignored(self):
+        self.assertEqual(parse_days(['שני', 'someday', 9]), 1 << 0)
+
+    def test_round_trip_to_hebrew_names(self):
+        record = ScheduleRecord.create('07:30', ['Sunday', 'Wednesday'])
+        self.assertEqual(record.day_names(HEBREW_DAY_NAMES),
+                         ['רביעי', 'ראשון'])
+
+
+class ScheduleRecordTest(unittest.TestCase):
+    def test_create(self):
+        record = ScheduleRecord.create('07:05', ['Monday', 'ראשון'], '15', ['hall'])
+        self.assertEqual(record.minute, 7 * 60 + 5)
+        self.assertEqual(record.days, 1 << 0 | 1 << 6)
+        self.assertEqual(record.stop_duration, 15)
+        self.assertEqual(record.time, '07:05')
+        self.assertEqual(record.minutes_of_week(), [425, 6 * 24 * 60 + 425])
+
+    def test_invalid_time(self):
+        for time_str in ('24:00', '12:60', 'noon'):
+            with self.assertRaises(ValueError):
+                parse_time(time_str)
+
+    def test_dict_and_tuple_round_trips(self):
+        record = ScheduleRecord.create('22:30', ['Friday'], 45, ['yard'], 'exams')
+        self.assertEqual(ScheduleRecord.from_dict(record.to_dict()), record)
+        self.assertEqual(ScheduleRecord.from_tuple(record.to_tuple()), record)
+        self.assertEqual(record.to_dict()['days'], ['Friday'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+from datetime import datetime
+
+from utils.clock import SimulatedClock
+from utils.scheduler import MusicScheduler
+from utils.simulation import simulate
+
+
+class PlayerStub:
+    """Records each shuffle_and_play() call with the simulated time it happened at."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.calls = []
+
+    def shuffle_and_play(self, stop_duration=0):
+        self.calls.append((self.clock.now(), stop_duration))
+
+
+class SimulatedSchedulerTest(unittest.TestCase):
+    """Base for tests of a scheduler driving a PlayerStub on a SimulatedClock."""
+
+    def make_scheduler(self, start):
+        self.clock = SimulatedClock(start)
+        self.player = PlayerStub(self.clock)
+        self.scheduler = MusicScheduler(self.player, clock=self.clock)
+        return self.scheduler
+
+
+class SchedulerTest(SimulatedSchedulerTest):
+    def test_next_fire(self):
+        # 2024-01-01 is a Monday
+        scheduler = self.make_scheduler(datetime(2024, 1, 1, 9, 0))
+        scheduler.add_schedule('08:00', ['Monday'])
+        scheduler.add_schedule('10:15', ['Wednesday'])
+        scheduler.start()
+
+        fire_at, schedules = scheduler.next_fire()
+        self.assertEqual(fire_at, datetime(2024, 1, 3, 10, 15))
+        self.assertEqual([record.time for record in schedules], ['10:15'])
+
+        self.clock.run_until(datetime(2024, 1, 3, 10, 16))
+        self.assertEqual(scheduler.next_fire()[0], datetime(2024, 1, 8, 8, 0))
+
+    def test_fires_on_the_given_days_for_a_week(self):
+        scheduler = self.make_scheduler(datetime(2024, 1, 1))
+        scheduler.add_schedule('08:00', ['Monday', 'Wednesday'], stop_duration=30)
+        scheduler.start()
+        self.clock.advance(7 * 24 * 60 * 60)
+
+        self.assertEqual(self.player.calls, [(datetime(2024, 1, 1, 8, 0), 30),
+                                             (datetime(2024, 1, 3, 8, 0), 30)])
+        self.assertEqual(scheduler.get_stats()['fires'], 2)
+
+    def test_schedule_added_while_running_fires(self):
+        scheduler = self.make_scheduler(datetime(2024, 1, 1, 7, 0))
+        scheduler.start()
+        scheduler.add_schedule('07:30')
+        self.clock.advance(60 * 60)
+        self.assertEqual(self.player.calls, [(datetime(2024, 1, 1, 7, 30), 0)])
+
+    def test_removed_schedule_does_not_fire(self):
+        scheduler = self.make_scheduler(datetime(2024, 1, 1))
+        job_id = scheduler.add_schedule('08:00')
+        scheduler.add_schedule('09:00')
+        scheduler.start()
+        scheduler.remove_job(job_id)
+        self.clock.advance(24 * 60 * 60)
+        self.assertEqual([when.hour for when, _ in self.player.calls], [9])
+
+    def test_simulation_is_deterministic(self):
+        schedules = [{'time': '08:00', 'days': [], 'stop_duration': 20}]
+        tracks = [f"{i}.mp3" for i in range(30)]
+        events = simulate(schedules, tracks, days=2, seed=5)
+        self.assertEqual(events, simulate(schedules, tracks, days=2, seed=5))
+        self.assertEqual([when for when, event, _ in events if event == 'fire'],
+                         [datetime(2024, 1, 1, 8, 0), datetime(2024, 1, 2, 8, 0)])
+
+
+class ClockJumpTest(SimulatedSchedulerTest):
+    def test_late_fire_within_catch_up_still_plays(self):
+        scheduler = self.make_scheduler(datetime(2024, 1, 1, 7, 59, 30))
+        scheduler.add_schedule('08:00')
+        scheduler.start()
+
+        # Wall clock steps 30s past the fire time (a short suspend)
+        self.clock.jump(60)
+
+        stats = scheduler.get_stats()
+        self.assertEqual(len(self.player.calls), 1)
+        self.assertEqual(stats['fires'], 1)
+        self.assertEqual(stats['late_fires'], 1)
+        self.assertEqual(stats['missed_fires'], 0)
+
+    def test_fire_beyond_catch_up_is_skipped(self):
+        scheduler = self.make_scheduler(datetime(2024, 1, 1, 7, 59, 30))
+        scheduler.add_schedule('08:00')
+        scheduler.start()
+
+        self.clock.jump(60 * 60)
+
+        stats = scheduler.get_stats()
+        self.assertEqual(self.player.calls, [])
+        self.assertEqual(stats['missed_fires'], 1)
+        self.assertEqual(stats['clock_jumps'], 1)
+        # The slot is requeued once, for the next day, not fired again
+        self.assertEqual(scheduler.next_fire()[0], datetime(2024, 1, 2, 8, 0))
+        self.assertIn('missed', [event for _, event, _ in self.clock.events])
+
+    def test_clock_jump_back_does_not_refire(self):
+        scheduler = self.make_scheduler(datetime(2024, 1, 1, 7, 59))
+        scheduler.add_schedule('08:00')
+        scheduler.start()
+        self.clock.advance(2 * 60)
+        self.assertEqual(len(self.player.calls), 1)
+
+        # Stepped back over the fire time; the next fire is tomorrow's
+        self.clock.jump(-5 * 60)
+        self.clock.advance(10 * 60)
+        self.assertEqual(len(self.player.calls), 1)
+        self.assertEqual(scheduler.next_fire()[0], datetime(2024, 1, 2, 8, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from utils.clock import SimulatedClock
+from utils.holidays import REPLACE, CalendarException
+from utils.scheduler import MusicScheduler, ScheduleRecord
+from utils.store import ScheduleStore
+
+
+class ScheduleStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = ScheduleStore(os.path.join(self.directory, 'music_scheduler.db'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def write_settings(self, settings):
+        path = os.path.join(self.directory, 'settings.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(settings, f, ensure_ascii=False)
+        return path
+
+    def test_import_settings(self):
+        path = self.write_settings({
+            'volume': 0.5,
+            'music_folder': '/music',
+            'schedules': [
+                {'time': '08:00', 'days': ['ראשון', 'שני'], 'stop_duration': 15, 'zones': ['hall']},
+                # Legacy entries carry their own folder and volume
+                {'time': '12:30', 'days': ['Friday'], 'music_folder': '/legacy', 'volume': 0.3},
+                {'time': '25:00', 'days': ['Monday']},
+                {'days': ['Monday']},
+            ],
+        })
+        self.assertEqual(self.store.import_settings(path), 2)
+
+        rows = self.store.schedules()
+        self.assertEqual([record for _, record in rows], [
+            ScheduleRecord.create('08:00', ['Sunday', 'Monday'], 15, ['hall']),
+            ScheduleRecord.create('12:30', ['Friday']),
+        ])
+        self.assertEqual(self.store.schedule_extra(rows[1][0]), {'music_folder': '/legacy', 'volume': 0.3})
+        self.assertEqual(self.store.settings(), {'volume': 0.5, 'music_folder': '/music'})
+
+        # Importing again replaces rather than duplicates
+        self.store.import_settings(path)
+        self.assertEqual(self.store.count_schedules(), 2)
+
+    def test_filter_by_zone(self):
+        self.store.add_schedule(ScheduleRecord.create('08:00', zones=['hall']))
+        self.store.add_schedule(ScheduleRecord.create('09:00', zones=['yard']))
+        self.store.add_schedule(ScheduleRecord.create('10:00'))
+        times = [record.time for _, record in self.store.schedules(zones=['hall'])]
+        self.assertEqual(times, ['08:00', '10:00'])
+
+    def test_load_into(self):
+        regular = self.store.add_schedule(ScheduleRecord.create('08:00', ['Monday'], 30))
+        exams = self.store.add_schedule(ScheduleRecord.create('10:00', group='exams'))
+        self.store.add_schedule(ScheduleRecord.create('11:00', group='past'))
+        self.store.add_exception(CalendarException(date(2023, 12, 1), date(2023, 12, 2), REPLACE, 'past'))
+        self.store.add_exception(CalendarException(date(2024, 1, 3), date(2024, 1, 3), REPLACE, 'exams'))
+
+        clock = SimulatedClock(datetime(2024, 1, 1))
+        scheduler = MusicScheduler(None, clock=clock)
+        job_ids = self.store.load_into(scheduler, since=date(2024, 1, 1))
+
+        # The 'past' group can never play again, so it is not loaded
+        self.assertEqual(sorted(job_ids.values()), [regular, exams])
+        self.assertEqual(sorted(record.time for record in scheduler.get_schedules()), ['08:00', '10:00'])
+        self.assertEqual(scheduler.calendar.active_group(date(2024, 1, 3)), 'exams')
+
+        scheduler.start()
+        clock.advance(7 * 24 * 60 * 60)
+        fires = [(when, details['time']) for when, event, details in clock.events if event == 'fire']
+        self.assertEqual(fires, [(datetime(2024, 1, 1, 8, 0), '08:00'), (datetime(2024, 1, 3, 10, 0), '10:00')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,8 +10,14 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from ui.app_styles import AppStyles
 from utils.music_player import MusicPlayer
-from utils.scheduler import MusicScheduler
-from utils.config import WINDOW_WIDTH, WINDOW_HEIGHT, SETTINGS_FILE, DEFAULT_SETTINGS
+from utils.scheduler import MusicScheduler, HEBREW_DAY_NAMES
+from utils.holidays import load_calendar
+from utils.settings import SettingsWriter, schedule_records
+from utils.config import WINDOW_WIDTH, WINDOW_HEIGHT, SETTINGS_FILE, EXCEPTIONS_FILE, DEFAULT_SETTINGS
+from utils.log import get_logger
+from utils import startup
+
+log = get_logger('ui')
 
 class MusicSchedulerApp:
     def __init__(self, root):
@@ -21,9 +27,16 @@ class MusicSchedulerApp:
         # Initialize music player and scheduler
         self.music_player = MusicPlayer()
         self.music_scheduler = MusicScheduler(self.music_player)
+        self.zones = []
+        # Plays the zoned schedules when the settings list zones
+        self.zone_coordinator = None
+        self.exceptions_file = EXCEPTIONS_FILE
+        # Written in the background; slider drags are coalesced into one write
+        self.settings_writer = SettingsWriter(SETTINGS_FILE)
         
         # Start the scheduler
         self.music_scheduler.start()
+        startup.mark('players')
         
         # Configure window
         self._configure_window()
@@ -33,9 +46,11 @@ class MusicSchedulerApp:
         
         # Create GUI first to initialize volume_var
         self.create_gui()
+        startup.mark('ui')
         
         # Then load settings
         self.load_settings()
+        startup.mark('settings')
 
     def _configure_window(self):
         """Configure window size and position with minimum dimensions."""
@@ -232,22 +247,14 @@ class MusicSchedulerApp:
             messagebox.showerror("שגיאה", "אנא בחר תיקיית מוזיקה לפני הוספת לוח זמנים")
             return
 
-        # Add the schedule
+        # Add the schedule; the running scheduler picks it up immediately
         try:
-            schedule_info = {
-                'time': time_str, 
-                'days': selected_days,
-                'stop_duration': int(self.duration_var.get())
-            }
             self.music_scheduler.add_schedule(time_str, selected_days, int(self.duration_var.get()))
             display_days = [day for day, var in self.day_vars.items() if var.get()]
             self.schedule_list.insert(tk.END, f"{time_str} - {', '.join(display_days)}\n")
             self.save_settings()
-            
-            # Restart the scheduler to pick up the new schedule
-            self.music_scheduler.stop()
-            self.music_scheduler.start()
         except Exception as e:
+            log.exception("Failed to add schedule")
             messagebox.showerror("שגיאה", f"שגיאה בהוספת לוח זמנים: {str(e)}")
 
     def remove_schedule(self):
@@ -257,6 +264,7 @@ class MusicSchedulerApp:
             self.music_scheduler.remove_schedule(0)
             self.save_settings()
         except Exception as e:
+            log.exception("Failed to remove schedule")
             messagebox.showerror("שגיאה", f"שגיאה בהסרת לוח זמנים: {str(e)}")
 
     def save_settings(self):
@@ -266,25 +274,51 @@ class MusicSchedulerApp:
                 'volume': self.volume_var.get(),
                 'music_folder': self.file_path_var.get(),
                 'schedules': [
-                    {
-                        'time': schedule['time'], 
-                        'days': schedule['days'],
-                        'stop_duration': schedule['stop_duration']
-                    } for schedule in self.music_scheduler.get_schedules()
-                ]
+                    schedule.to_dict() for schedule in self.music_scheduler.get_schedules()
+                ],
+                # Zones are edited in the settings file; keep them as loaded
+                'zones': self.zones,
+                'exceptions_file': self.exceptions_file
             }
 
-            with open('settings.json', 'w') as f:
-                json.dump(settings, f, indent=4)
+            self.settings_writer.save(settings)
         except Exception as e:
+            log.exception("Failed to save settings")
             messagebox.showerror("שגיאה", f"שגיאה בשמירת הגדרות: {str(e)}")
 
+    def _start_zones(self):
+        """Start a player process per configured zone for the schedules that target zones."""
+        from utils.zones import ZoneCoordinator
+
+        if self.zone_coordinator is not None:
+            self.zone_coordinator.stop()
+        try:
+            self.zone_coordinator = ZoneCoordinator(self.zones)
+            self.zone_coordinator.start()
+        except Exception as e:
+            log.exception("Could not start the audio zones")
+            self.zone_coordinator = None
+            messagebox.showwarning("אזהרה", f"לא ניתן להפעיל את אזורי השמע: {str(e)}")
+            return
+        self.music_scheduler.set_zone_players(self.zone_coordinator.players())
+
+    def stop(self):
+        """Stop the scheduler and players and write pending settings."""
+        self.music_scheduler.stop()
+        if self.zone_coordinator is not None:
+            self.zone_coordinator.stop()
+        self.settings_writer.close()
+
     def load_settings(self):
         """Load application settings from file."""
         try:
-            with open('settings.json', 'r') as f:
+            with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
                 settings = json.load(f)
                 
+            self.zones = settings.get('zones', [])
+            if self.zones:
+                self._start_zones()
+
             # Restore volume
             volume = settings.get('volume', 0.7)
             self.volume_var.set(volume)
@@ -295,38 +329,53 @@ class MusicSchedulerApp:
             if music_folder and os.path.exists(music_folder):
                 self.file_path_var.set(music_folder)
                 try:
-                    self.music_player.load_playlist(music_folder)
+                    # Read in the background; the first fire waits for it if it must
+                    self.music_player.load_playlist(music_folder, background=True)
                 except Exception as e:
+                    log.warning("Could not load music folder %s: %s", music_folder, e)
                     messagebox.showwarning("אזהרה", f"לא ניתן לטעון את תיקיית המוזיקה: {str(e)}")
 
             # Restore schedules
             self.schedule_list.delete('1.0', tk.END)
-            schedules = settings.get('schedules', [])
-            for schedule in schedules:
-                time_str = schedule.get('time', '')
-                days = schedule.get('days', [])
-                stop_duration = schedule.get('stop_duration', 0)
-                if time_str:
-                    self.music_scheduler.add_schedule(time_str, days, stop_duration)
-                    self.schedule_list.insert(tk.END, f"{time_str} - {', '.join(days)}\n")
-
-            # Restart scheduler to apply loaded schedules
-            self.music_scheduler.stop()
-            self.music_scheduler.start()
+            # Malformed entries are logged and skipped rather than stopping the window from opening;
+            # day names are normalised here, whatever language they were saved in
+            records = schedule_records(settings)
+            self.music_scheduler.add_records(records)
+            for record in records:
+                display_days = record.day_names(HEBREW_DAY_NAMES)
+                self.schedule_list.insert(tk.END, f"{record.time} - {', '.join(display_days)}\n")
+
+            # Holidays are applied at fire time; the schedules stay as they are
+            self.exceptions_file = settings.get('exceptions_file', EXCEPTIONS_FILE)
+            try:
+                self.music_scheduler.set_calendar(load_calendar(self.exceptions_file))
+            except (OSError, ValueError, KeyError) as e:
+                log.warning("Could not load exceptions file %s: %s", self.exceptions_file, e)
+                messagebox.showwarning("אזהרה", f"לא ניתן לטעון את קובץ החגים: {str(e)}")
 
         except FileNotFoundError:
             # First-time setup or no settings file
             pass
         except json.JSONDecodeError:
+            log.error("Settings file is corrupt")
             messagebox.showerror("שגיאה", "קובץ ההגדרות פגום")
 
-def main():
+def main(profile_startup=False):
     root = tk.Tk()
     app = MusicSchedulerApp(root)
     
+    if profile_startup:
+        # Draw the window once, report and quit
+        root.update()
+        startup.mark('window')
+        startup.report()
+        app.stop()
+        root.destroy()
+        return
+    
     def on_closing():
         # Stop the scheduler before closing
-        app.music_scheduler.stop()
+        app.stop()
         root.destroy()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
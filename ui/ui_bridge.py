@@ -0,0 +1,82 @@
+"""
+Thread-safe bridge from background threads to Tk widgets.
+
+Tk may only be touched from the thread running its main loop. Background
+components (the scheduler, players, library scans) post updates here
+instead; the main loop drains them every UI_REFRESH_MS with after().
+Updates with the same key replace each other, so a widget is refreshed at
+most once per frame however often a worker reports, and the queue never
+holds more than UI_QUEUE_SIZE distinct keys.
+"""
+import collections
+import threading
+
+from utils.config import UI_QUEUE_SIZE, UI_REFRESH_MS
+from utils.log import get_logger
+
+log = get_logger('ui')
+
+
+class UIBridge:
+    def __init__(self, root, interval_ms=UI_REFRESH_MS, max_pending=UI_QUEUE_SIZE):
+        """
+        :param root: Tk root whose main loop applies the updates
+        :param interval_ms: How often queued updates are applied
+        :param max_pending: Most distinct updates held; posts beyond it are dropped
+        """
+        self.root = root
+        self.interval_ms = interval_ms
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = collections.OrderedDict()
+        self._after_id = None
+        self.stats = {
+            'posted': 0,
+            'coalesced': 0,
+            'dropped': 0,
+            'frames': 0,
+        }
+
+    def post(self, key, callback, *args):
+        """
+        Run callback(*args) on the Tk thread at the next refresh.
+
+        A pending update with the same key is replaced (keeping its place),
+        so only the latest state is applied. Safe to call from any thread.
+        Returns False if the queue is full and the update was dropped.
+        """
+        with self._lock:
+            self.stats['posted'] += 1
+            if key in self._pending:
+                self.stats['coalesced'] += 1
+            elif len(self._pending) >= self.max_pending:
+                self.stats['dropped'] += 1
+                return False
+            self._pending[key] = (callback, args)
+            return True
+
+    def config(self, widget, **options):
+        """Queue widget.config(**options); later updates of the same options win."""
+        return self.post((str(widget), tuple(sorted(options))), lambda: widget.config(**options))
+
+    def start(self):
+        """Start applying updates. Call from the Tk thread."""
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        """Stop applying updates. Call from the Tk thread."""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, collections.OrderedDict()
+        for callback, args in pending.values():
+            try:
+                callback(*args)
+            except Exception:
+                log.exception("Error applying UI update")
+        self.stats['frames'] += 1
+        self._after_id = self.root.after(self.interval_ms, self._drain)
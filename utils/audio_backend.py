@@ -0,0 +1,277 @@
+import io
+import math
+import os
+import threading
+import time
+
+# The mixer's end-of-track events need SDL's event queue, which needs a
+# video driver; the dummy one never opens a window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from utils.config import AUDIO_END_MARGIN, AUDIO_END_POLL, AUDIO_MONITOR_INTERVAL, QUEUE_VOLUME_TOLERANCE_DB
+from utils.log import get_logger
+
+log = get_logger('player')
+
+# pygame is imported when the first track plays: importing it and opening
+# the mixer are a large part of startup, and a player may never play
+pygame = None
+# Posted by pygame.mixer.music whenever a track finishes (or a queued one takes over)
+TRACK_END = None
+
+
+def _import_pygame():
+    global pygame, TRACK_END
+    if pygame is None:
+        import pygame as module
+        TRACK_END = module.USEREVENT + 1
+        pygame = module
+
+
+class PygameBackend:
+    """
+    Audio output through pygame.mixer.music.
+
+    play() starts a track and on_track_end(ended_at) is called (from the
+    monitor thread) once the mixer reports it finished on its own; stop()
+    never triggers it. The monitor sleeps on a condition while nothing
+    plays. When the track's length is known it also sleeps through the
+    track, until `end_margin` seconds before the mixer position says it
+    ends, then checks SDL's event queue every `end_poll` seconds; a track of
+    unknown length is checked every `poll_interval` seconds throughout.
+    (pygame.event.wait() is no cheaper: without a real video driver SDL
+    implements it as a 1 ms pump-and-sleep loop.) `wakeups` counts the checks.
+
+    preload() reads the next track on a background thread and queues it on
+    the mixer, so the mixer moves on to it without a gap. The switch happens
+    inside SDL at the current volume, so a track that needs a different one
+    (another loudness gain) is not queued; play() starts it at its own volume.
+
+    The mixer is opened, and the threads started, by the first play().
+    """
+
+    def __init__(self, device=None, poll_interval=AUDIO_MONITOR_INTERVAL, end_margin=AUDIO_END_MARGIN,
+                 end_poll=AUDIO_END_POLL):
+        """
+        :param device: Output device name to open (None for the system default)
+        :param poll_interval: Seconds between checks for a finished track of unknown length
+        :param end_margin: Seconds before a track's expected end to start checking for it
+        :param end_poll: Seconds between checks from then on
+        """
+        self.device = device
+        self.poll_interval = poll_interval
+        self.end_margin = end_margin
+        self.end_poll = end_poll
+        self.wakeups = 0
+        self.on_track_end = None
+        self._opened = False
+        self._volume = None
+        self._playing = False
+        # Length in seconds of the track playing, if known
+        self._duration = None
+        self._closed = False
+        self._condition = threading.Condition()
+
+        # Look-ahead state: the track to read next (and its length), the
+        # last one read (path, bytes), the one queued on the mixer, and a
+        # queued track the mixer has already started on its own
+        self._preload_path = None
+        self._preload_duration = None
+        self._preload_volume = None
+        self._preloaded = None
+        self._queued = None
+        self._queued_duration = None
+        self._autostarted = None
+        self._monitor_thread = None
+
+    def _open(self):
+        """Open the mixer and start the threads, once. Caller must hold the condition."""
+        if self._opened:
+            return
+        _import_pygame()
+        if self.device:
+            pygame.mixer.init(devicename=self.device)
+        else:
+            pygame.mixer.init()
+        pygame.display.init()
+        # Nothing else should wake the monitor
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([TRACK_END])
+        pygame.mixer.music.set_endevent(TRACK_END)
+        if self._volume is not None:
+            pygame.mixer.music.set_volume(self._volume)
+        self._opened = True
+
+        self._monitor_thread = threading.Thread(target=self._monitor, name="pygame-monitor", daemon=True)
+        self._monitor_thread.start()
+        self._preload_thread = threading.Thread(target=self._preloader, name="pygame-preload", daemon=True)
+        self._preload_thread.start()
+
+    def set_volume(self, volume):
+        with self._condition:
+            self._volume = volume
+            if self._opened:
+                pygame.mixer.music.set_volume(volume)
+
+    def _source(self, path):
+        """Return the preloaded bytes of `path` if we have them, else the path itself."""
+        if self._preloaded is not None and self._preloaded[0] == path:
+            return io.BytesIO(self._preloaded[1])
+        return path
+
+    def play(self, path, volume, duration=None):
+        """
+        Load and start a track. Returns the monotonic time it started, or None
+        if the mixer already started it from its queue: that switch happens
+        inside SDL, so there is no gap we could measure.
+
+        :param duration: Track length in seconds, if known, so the monitor can sleep through it
+        """
+        with self._condition:
+            self._open()
+            self._volume = volume
+            self._duration = duration
+            pygame.mixer.music.set_volume(volume)
+            if self._autostarted == path:
+                # The mixer already moved on to this queued track
+                self._autostarted = None
+                return None
+
+            # Replacing a playing track would post an end event; it is not ours
+            pygame.mixer.music.set_endevent()
+            pygame.mixer.music.load(self._source(path), os.path.splitext(path)[1])
+            pygame.mixer.music.play()
+            pygame.mixer.music.set_endevent(TRACK_END)
+            self._queued = None
+            self._autostarted = None
+            self._playing = True
+            self._condition.notify_all()
+            return time.monotonic()
+
+    def preload(self, path, duration=None, volume=None):
+        """
+        Read `path` in the background and queue it to follow the current track.
+
+        :param volume: The volume the track will play at; it is only queued if that
+                       is close to the current one
+        """
+        with self._condition:
+            self._preload_path = path
+            self._preload_duration = duration
+            self._preload_volume = volume
+            self._condition.notify_all()
+
+    def _same_volume(self, volume):
+        """Whether a track at `volume` can follow the current one without a volume change."""
+        if volume is None or volume == self._volume:
+            return True
+        if not volume or not self._volume:
+            return False
+        return abs(20 * math.log10(volume / self._volume)) <= QUEUE_VOLUME_TOLERANCE_DB
+
+    def stop(self):
+        with self._condition:
+            self._playing = False
+            self._preload_path = None
+            self._queued = None
+            self._autostarted = None
+            if not self._opened:
+                return
+            # Stopping also drops whatever was queued
+            pygame.mixer.music.set_endevent()
+            pygame.mixer.music.stop()
+            pygame.mixer.music.set_endevent(TRACK_END)
+            pygame.event.clear(TRACK_END)
+            self._condition.notify_all()
+
+    def close(self):
+        """Stop playback and let the monitor thread exit."""
+        with self._condition:
+            self._closed = True
+        self.stop()
+        if self._monitor_thread is not None:
+            self._monitor_thread.join()
+
+    def _preloader(self):
+        """Read upcoming tracks off the (possibly slow) disk and queue them."""
+        while True:
+            with self._condition:
+                while self._preload_path is None:
+                    self._condition.wait()
+                path, duration, volume = self._preload_path, self._preload_duration, self._preload_volume
+                self._preload_path = None
+                cached = self._preloaded is not None and self._preloaded[0] == path
+
+            if not cached:
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                except OSError as e:
+                    log.warning("Could not preload %s: %s", path, e)
+                    continue
+
+            with self._condition:
+                if not cached:
+                    self._preloaded = (path, data)
+                # Only queue behind a track that is still playing
+                if not self._playing or self._preload_path is not None:
+                    continue
+                if not self._same_volume(volume):
+                    log.debug("Not queueing %s: it plays at a different volume", path)
+                    continue
+                try:
+                    pygame.mixer.music.queue(io.BytesIO(self._preloaded[1]), os.path.splitext(path)[1])
+                    self._queued = path
+                    self._queued_duration = duration
+                except pygame.error as e:
+                    log.warning("Could not queue %s: %s", path, e)
+
+    def _monitor(self):
+        """Wait for the current track to finish and report it."""
+        while True:
+            with self._condition:
+                # Nothing to watch while idle: sleep until play() or close()
+                self._condition.wait_for(lambda: self._playing or self._closed)
+                if self._closed:
+                    return
+                # play(), stop() and close() cut the wait short
+                self._condition.wait(self._next_check())
+                if self._closed:
+                    return
+                if not self._playing:
+                    continue
+                self.wakeups += 1
+                if not pygame.event.get(TRACK_END):
+                    continue
+                ended_at = time.monotonic()
+                if self._queued is not None:
+                    # The mixer has already started the queued track
+                    self._autostarted = self._queued
+                    self._duration = self._queued_duration
+                    self._queued = None
+                else:
+                    self._playing = False
+                callback = self.on_track_end
+
+            if callback is not None:
+                try:
+                    callback(ended_at)
+                except Exception:
+                    log.exception("Error in track end handler")
+
+    def _next_check(self):
+        """Return how long the monitor can sleep before checking for the track end. Caller must hold the condition."""
+        if self._duration is None:
+            return self.poll_interval
+        position = pygame.mixer.music.get_pos()
+        if position < 0:
+            # Already finished; the end event is waiting
+            return self.end_poll
+        # The mixer restarts its position when it moves on to a queued track
+        remaining = self._duration - position / 1000.0
+        if remaining > self.end_margin:
+            return remaining - self.end_margin
+        if remaining < -self.end_margin:
+            # Longer than its recorded length; stop checking so often
+            return self.poll_interval
+        return self.end_poll
@@ -0,0 +1,235 @@
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+
+from utils.config import TIMER_MAX_WAIT
+from utils.log import get_logger
+
+log = get_logger('clock')
+
+
+class TimerHandle:
+    """Handle returned by a clock's call_at()/call_later(); cancel() drops the callback."""
+
+    __slots__ = ('when', 'callback', 'cancelled', '_clock')
+
+    def __init__(self, clock, when, callback):
+        self._clock = clock
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        """Prevent the callback from running. Safe to call more than once."""
+        if not self.cancelled:
+            self.cancelled = True
+            self._clock._cancelled(self)
+
+
+class SystemClock:
+    """
+    Real wall-clock time.
+
+    Timers run on one shared daemon thread that keeps min-heaps of deadlines
+    and sleeps on a condition variable until the earliest one, so any number
+    of pending timers costs a single thread.
+
+    call_at() deadlines are wall-clock instants but condition waits are
+    measured on the monotonic clock, so while such a timer is pending the
+    thread re-checks the wall clock at least every max_wait seconds; a
+    stepped clock or a resume from suspend is therefore noticed within that
+    bound. This is a deliberate trade-off: with any schedule loaded the thread
+    wakes at least 3600 / max_wait times an hour (60 with the default
+    TIMER_MAX_WAIT). call_later() delays are kept on the monotonic clock in a
+    heap of their own, so a clock step neither shortens nor stretches them,
+    and they need no such re-checks. `wakeups` counts every time the thread
+    wakes.
+    """
+
+    def __init__(self, max_wait=TIMER_MAX_WAIT):
+        self.max_wait = max_wait
+        self.wakeups = 0
+        # Wall-clock deadlines (time.time()) and monotonic ones (time.monotonic())
+        self._heap = []
+        self._relative = []
+        self._sequence = itertools.count()
+        self._cancelled_count = 0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def now(self):
+        return datetime.now()
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def record(self, event, **details):
+        """Event log hook; the real clock does not keep an event log."""
+
+    def call_at(self, when, callback):
+        """Run callback on the timer thread once wall time reaches datetime `when`."""
+        return self._schedule(self._heap, when.timestamp(), TimerHandle(self, when, callback))
+
+    def call_later(self, delay, callback):
+        """Run callback on the timer thread after `delay` seconds, however the wall clock moves."""
+        # `when` is only the expected wall time; the deadline is monotonic
+        handle = TimerHandle(self, datetime.now() + timedelta(seconds=delay), callback)
+        return self._schedule(self._relative, time.monotonic() + delay, handle)
+
+    def _schedule(self, heap, deadline, handle):
+        with self._condition:
+            heapq.heappush(heap, (deadline, next(self._sequence), handle))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="clock-timer", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return handle
+
+    def _cancelled(self, handle):
+        with self._condition:
+            self._cancelled_count += 1
+            # Compact once cancelled entries dominate the heaps
+            if self._cancelled_count > 64 and self._cancelled_count * 2 > len(self._heap) + len(self._relative):
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+                self._relative = [entry for entry in self._relative if not entry[2].cancelled]
+                heapq.heapify(self._relative)
+                self._cancelled_count = 0
+            self._condition.notify()
+
+    def _run(self):
+        """Timer thread: sleep until the earliest deadline, then run its callback."""
+        while True:
+            with self._condition:
+                for heap in (self._heap, self._relative):
+                    while heap and heap[0][2].cancelled:
+                        heapq.heappop(heap)
+                        self._cancelled_count = max(0, self._cancelled_count - 1)
+                if not self._heap and not self._relative:
+                    self._condition.wait()
+                    self.wakeups += 1
+                    continue
+                due, delay = None, None
+                if self._heap:
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        due = self._heap
+                    else:
+                        # Re-check the wall clock now and then; it may be stepped
+                        delay = min(delay, self.max_wait)
+                if due is None and self._relative:
+                    relative_delay = self._relative[0][0] - time.monotonic()
+                    if relative_delay <= 0:
+                        due = self._relative
+                    elif delay is None or relative_delay < delay:
+                        delay = relative_delay
+                if due is None:
+                    self._condition.wait(delay)
+                    self.wakeups += 1
+                    continue
+                handle = heapq.heappop(due)[2]
+                handle.cancelled = True  # fired handles can no longer be cancelled
+
+            try:
+                handle.callback()
+            except Exception:
+                log.exception("Error in timer callback")
+
+
+class SimulatedClock:
+    """
+    Fast-forward clock for validation and benchmarks.
+
+    Time only moves when advance() or run_until() is called; due timers run
+    synchronously on the caller's thread in deadline order, so a week of
+    schedules replays in milliseconds and produces the same event log on
+    every run.
+    """
+
+    def __init__(self, start=None):
+        # Default to a Monday midnight so minute-of-week 0 is the start
+        self._now = start or datetime(2024, 1, 1)
+        self._monotonic = 0.0
+        # call_at() timers by wall time, call_later() ones by monotonic time
+        self._heap = []
+        self._relative = []
+        self._sequence = itertools.count()
+        self.events = []
+
+    def now(self):
+        return self._now
+
+    def time(self):
+        return self._now.timestamp()
+
+    def monotonic(self):
+        return self._monotonic
+
+    def record(self, event, **details):
+        """Append an entry to the deterministic event log."""
+        self.events.append((self._now, event, details))
+
+    def call_at(self, when, callback):
+        handle = TimerHandle(self, when, callback)
+        heapq.heappush(self._heap, (when, next(self._sequence), handle))
+        return handle
+
+    def call_later(self, delay, callback):
+        handle = TimerHandle(self, self._now + timedelta(seconds=delay), callback)
+        heapq.heappush(self._relative, (self._monotonic + delay, next(self._sequence), handle))
+        return handle
+
+    def _cancelled(self, handle):
+        pass
+
+    def _set_now(self, when):
+        if when > self._now:
+            self._monotonic += (when - self._now).total_seconds()
+            self._now = when
+
+    def _next_due(self, end):
+        """Pop the earliest timer due by datetime `end`; return (wall time, handle) or None."""
+        when = self._heap[0][0] if self._heap else None
+        if self._relative:
+            # Wall and monotonic time move together until the next jump()
+            relative_when = self._now + timedelta(seconds=self._relative[0][0] - self._monotonic)
+            if (when is None or relative_when < when) and relative_when <= end:
+                return relative_when, heapq.heappop(self._relative)[2]
+        if when is None or when > end:
+            return None
+        return when, heapq.heappop(self._heap)[2]
+
+    def run_until(self, end):
+        """Run every timer due up to datetime `end`, then leave the clock at `end`."""
+        while True:
+            due = self._next_due(end)
+            if due is None:
+                break
+            when, handle = due
+            if handle.cancelled:
+                continue
+            handle.cancelled = True
+            self._set_now(when)
+            handle.callback()
+        self._set_now(end)
+
+    def advance(self, seconds):
+        """Move time forward by `seconds`, running timers as they fall due."""
+        self.run_until(self._now + timedelta(seconds=seconds))
+
+    def jump(self, seconds):
+        """
+        Step the wall clock by `seconds` without monotonic time passing, as an
+        NTP step or a resume from suspend would, then run any overdue timers.
+        """
+        self._now += timedelta(seconds=seconds)
+        self.run_until(self._now)
+
+
+# Shared by every component that is not given its own clock
+system_clock = SystemClock()
@@ -7,11 +7,63 @@ WINDOW_HEIGHT = 600
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SETTINGS_FILE = os.path.join(BASE_DIR, 'settings.json')
+EXCEPTIONS_FILE = os.path.join(BASE_DIR, 'exceptions.json')  # Holidays that skip or replace schedules
+LIBRARY_CACHE_DIR = os.path.join(BASE_DIR, 'cache')          # Music library indexes
+STORE_FILE = os.path.join(BASE_DIR, 'music_scheduler.db')    # Optional SQLite schedule store
+
+# Settings file
+SETTINGS_SAVE_DELAY = 0.5   # Changes within this many seconds are written together
+
+# Scheduler timing
+CATCH_UP_SECONDS = 60       # Fire schedules at most this late; skip (and count) later ones
+LATE_FIRE_SECONDS = 1.0     # Fires later than this are counted as late
+CLOCK_JUMP_SECONDS = 2.0    # Wall/monotonic drift treated as a clock step or suspend
+# Longest timer sleep, bounding how long a clock step goes unnoticed. The cost is that the timer
+# thread wakes 3600 / TIMER_MAX_WAIT times an hour whenever any schedule is loaded; it only
+# sleeps indefinitely with no timers pending at all
+TIMER_MAX_WAIT = 60.0
+
+# Audio output
+AUDIO_MONITOR_INTERVAL = 0.25   # How often a track of unknown length is checked for having finished
+AUDIO_END_MARGIN = 0.25         # A track of known length is checked from this long before its expected end...
+AUDIO_END_POLL = 0.01           # ...this often, so the next track starts within about this long
+
+# Playback history
+PLAY_HISTORY_SIZE = 200         # Recently played songs a new session avoids repeating
+
+# Playlist planning
+PLAN_TOLERANCE_SECONDS = 5.0    # A plan this close to filling its window is good enough
+
+# Loudness normalisation
+LOUDNESS_TARGET_DBFS = -20.0    # RMS level every track is brought to
+LOUDNESS_MIN_GAIN = 0.1
+LOUDNESS_MAX_GAIN = 4.0
+# The mixer switches to a queued track by itself, before its volume can be set; a track whose
+# output volume differs by more than this from the one before it is started by play() instead
+QUEUE_VOLUME_TOLERANCE_DB = 1.0
+
+# Music library
+LIBRARY_WATCH_INTERVAL = 30.0   # Seconds between background re-scans of open libraries (0 disables)
+LIBRARY_WATCH_MAX_LOAD = 0.05   # Longest fraction of time the watcher may spend scanning
+
+# Zone worker supervision
+ZONE_RESTART_DELAY = 2.0    # Seconds to wait before restarting a zone worker that died
+
+# Logging
+LOG_FILE = os.path.join(BASE_DIR, 'music_scheduler.log')
+LOG_BUFFER_SIZE = 1000          # Recent log records kept in memory for the UI and diagnostics
+LOG_RATE_LIMIT_BURST = 5        # Records allowed per call site...
+LOG_RATE_LIMIT_INTERVAL = 10.0  # ...in this many seconds
+
+# UI
+UI_REFRESH_MS = 100         # How often updates posted by background threads reach the widgets
+UI_QUEUE_SIZE = 256         # Most distinct pending UI updates; more are dropped
 
 # Default settings
 DEFAULT_SETTINGS = {
     'music_folder': '',
     'volume': 0.7,
     'selected_days': [],
+    'zones': [],
     'schedules': []
 }
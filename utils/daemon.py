@@ -0,0 +1,134 @@
+"""
+Headless scheduler service.
+
+Runs the schedules from the settings file without any GUI: no tkinter is
+imported, and the process just sleeps between fires. Sites with zones
+get a player process per zone; otherwise one player uses the default
+output device. SIGTERM and Ctrl+C stop playback and exit cleanly, so it
+can run under systemd, a Windows service wrapper or a container:
+
+    python main.py --headless [--settings settings.json] [--debug]
+"""
+import argparse
+import signal
+import threading
+
+from utils.config import LOG_FILE, SETTINGS_FILE
+from utils.holidays import load_calendar
+from utils.log import get_logger, setup_logging
+from utils.scheduler import MusicScheduler
+from utils.settings import exceptions_file, load_settings, schedule_records
+from utils import startup
+
+log = get_logger('daemon')
+
+
+class SchedulerService:
+    """The players and scheduler described by a settings dict."""
+
+    def __init__(self, settings, store=None):
+        """
+        :param store: Optional ScheduleStore to take the schedules and exceptions from
+                      instead of the settings
+        """
+        self.settings = settings
+        self.store = store
+        self.coordinator = None
+        self.player = None
+        self.scheduler = None
+
+    def start(self):
+        settings = self.settings
+        zones = settings.get('zones', [])
+        if zones:
+            from utils.zones import ZoneCoordinator
+
+            self.coordinator = ZoneCoordinator(zones)
+            self.coordinator.start()
+            # Schedules without zones play everywhere
+            self.scheduler = MusicScheduler(self.coordinator.all_zones_player(),
+                                            zone_players=self.coordinator.players())
+        else:
+            from utils.music_player import MusicPlayer
+
+            self.player = MusicPlayer(volume=settings.get('volume', 0.7))
+            self.player.set_volume(self.player.volume)
+            music_folder = settings.get('music_folder')
+            if music_folder:
+                try:
+                    self.player.load_playlist(music_folder)
+                except ValueError as e:
+                    log.error("%s", e)
+            self.scheduler = MusicScheduler(self.player)
+        startup.mark('players')
+
+        if self.store is not None:
+            self.store.load_into(self.scheduler)
+        else:
+            self.scheduler.set_calendar(load_calendar(exceptions_file(settings)))
+            self.scheduler.add_records(schedule_records(settings))
+        self.scheduler.start()
+        startup.mark('scheduler')
+
+    def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.player is not None:
+            self.player.stop()
+        if self.coordinator is not None:
+            self.coordinator.stop()
+
+
+def run(settings_file=SETTINGS_FILE, profile_startup=False, store_file=None):
+    """
+    Run the service until SIGTERM or Ctrl+C.
+
+    :param profile_startup: Stop as soon as the service is up and print the startup phases
+    :param store_file: SQLite schedule store (see utils.store) to use instead of the
+                       settings file's schedules; its stored settings override the file's
+    """
+    stopped = threading.Event()
+    signal.signal(signal.SIGINT, lambda *args: stopped.set())
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, lambda *args: stopped.set())
+
+    settings = load_settings(settings_file)
+    store = None
+    if store_file:
+        from utils.store import ScheduleStore
+
+        store = ScheduleStore(store_file)
+        settings.update(store.settings())
+    service = SchedulerService(settings, store)
+    startup.mark('settings')
+    service.start()
+    log.info("Headless scheduler running")
+    if profile_startup:
+        startup.report()
+        stopped.set()
+    # Event.wait() with no timeout can't be interrupted on some platforms; wake now and then
+    while not stopped.wait(3600):
+        pass
+
+    log.info("Shutting down")
+    service.stop()
+    if store is not None:
+        store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the music scheduler without a GUI")
+    parser.add_argument('--headless', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--settings', default=SETTINGS_FILE, help="settings JSON file")
+    parser.add_argument('--store', metavar='DB', help="take schedules and exceptions from this SQLite store")
+    parser.add_argument('--log-file', default=LOG_FILE, help="also log to this file ('' for none)")
+    parser.add_argument('--debug', action='store_true', help="log per-schedule and per-track detail")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="exit once started and print the time of each startup phase as JSON")
+    args = parser.parse_args(argv)
+    setup_logging(debug=args.debug, log_file=args.log_file or None)
+    run(args.settings, profile_startup=args.profile_startup, store_file=args.store)
+
+
+if __name__ == "__main__":
+    main()
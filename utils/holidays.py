@@ -0,0 +1,161 @@
+"""
+Holiday and exception calendar.
+
+Date-range exceptions either skip every regular schedule or replace them
+with another schedule group (schedules whose 'group' matches). They are
+loaded from a JSON file:
+
+    {"exceptions": [
+        {"name": "Sukkot", "start": "2026-10-06", "end": "2026-10-13", "action": "skip"},
+        {"name": "Exams", "start": "2027-01-10", "end": "2027-01-14",
+         "action": "replace", "group": "exams"}
+    ]}
+
+Ranges are inclusive. Where ranges overlap, the one listed later wins.
+"""
+import bisect
+import heapq
+import json
+import os
+from datetime import date
+
+from utils.log import get_logger
+
+log = get_logger('holidays')
+
+SKIP = 'skip'
+REPLACE = 'replace'
+
+
+class CalendarException:
+    """One date-range exception; `group` names the replacement schedule group."""
+
+    __slots__ = ('name', 'start', 'end', 'action', 'group')
+
+    def __init__(self, start, end, action=SKIP, group=None, name=''):
+        if end < start:
+            raise ValueError(f"Exception '{name}' ends before it starts")
+        if action not in (SKIP, REPLACE):
+            raise ValueError(f"Unknown exception action {action!r}")
+        if action == REPLACE and not group:
+            raise ValueError(f"Exception '{name}' replaces schedules but names no group")
+        self.name = name
+        self.start = start
+        self.end = end
+        self.action = action
+        self.group = group
+
+    @classmethod
+    def from_dict(cls, data):
+        start = date.fromisoformat(data['start'])
+        end = date.fromisoformat(data.get('end', data['start']))
+        return cls(start, end, data.get('action', SKIP), data.get('group'), data.get('name', ''))
+
+    def to_dict(self):
+        data = {
+            'name': self.name,
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'action': self.action,
+        }
+        if self.group:
+            data['group'] = self.group
+        return data
+
+    def __repr__(self):
+        return f"CalendarException({self.name!r}, {self.start}..{self.end}, {self.action}, group={self.group!r})"
+
+
+class ExceptionCalendar:
+    """
+    Interval index over date-range exceptions.
+
+    Overlapping ranges are flattened once into sorted, disjoint segments, so
+    looking up a date is a single bisect: O(log n) however many years of
+    entries are loaded.
+    """
+
+    def __init__(self, exceptions=()):
+        self._exceptions = list(exceptions)
+        self._build()
+
+    def __len__(self):
+        return len(self._exceptions)
+
+    @classmethod
+    def load(cls, path):
+        """Load exceptions from a JSON file."""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        calendar = cls(CalendarException.from_dict(entry) for entry in data.get('exceptions', []))
+        log.info("Loaded %d calendar exception(s) from %s", len(calendar), path)
+        return calendar
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'exceptions': [exception.to_dict() for exception in self._exceptions]},
+                      f, ensure_ascii=False, indent=4)
+
+    def add(self, exception):
+        self._exceptions.append(exception)
+        self._build()
+
+    def exceptions(self):
+        return list(self._exceptions)
+
+    def _build(self):
+        """Flatten the (possibly overlapping) ranges into disjoint segments."""
+        entries = [(exception.start.toordinal(), exception.end.toordinal(), priority, exception)
+                   for priority, exception in enumerate(self._exceptions)]
+        entries.sort(key=lambda entry: entry[0])
+        points = sorted({entry[0] for entry in entries} | {entry[1] + 1 for entry in entries})
+
+        starts, segments = [], []
+        active = []  # heap of (-priority, end, exception); expired entries removed lazily
+        next_entry = 0
+        for point, next_point in zip(points, points[1:]):
+            while next_entry < len(entries) and entries[next_entry][0] <= point:
+                start, end, priority, exception = entries[next_entry]
+                heapq.heappush(active, (-priority, end, exception))
+                next_entry += 1
+            while active and active[0][1] < point:
+                heapq.heappop(active)
+            if not active:
+                continue
+
+            exception = active[0][2]
+            if segments and segments[-1][1] == point - 1 and segments[-1][2] is exception:
+                segments[-1] = (segments[-1][0], next_point - 1, exception)
+            else:
+                starts.append(point)
+                segments.append((point, next_point - 1, exception))
+
+        self._starts = starts
+        self._segments = segments
+
+    def lookup(self, day):
+        """Return the exception in force on `day` (a date), or None."""
+        ordinal = day.toordinal()
+        index = bisect.bisect_right(self._starts, ordinal) - 1
+        if index >= 0 and ordinal <= self._segments[index][1]:
+            return self._segments[index][2]
+        return None
+
+    def active_group(self, day):
+        """
+        Return which schedules run on `day`: None for the regular ones, a
+        group name when an exception replaces them, or SKIP for none at all.
+        """
+        exception = self.lookup(day)
+        if exception is None:
+            return None
+        if exception.action == SKIP:
+            return SKIP
+        return exception.group
+
+
+def load_calendar(path):
+    """Load the exception calendar at `path`, or return None if there is no such file."""
+    if not path or not os.path.exists(path):
+        return None
+    return ExceptionCalendar.load(path)
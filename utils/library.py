@@ -0,0 +1,286 @@
+"""
+Music library index.
+
+Every player looks up its tracks here instead of listing the music folder
+itself. A MusicLibrary scans its folder recursively with os.scandir and
+persists what it found, so the next run starts from the saved index. A
+re-scan only lists directories whose mtime changed since the last scan;
+unchanged directories cost one stat each.
+
+A shared LibraryWatcher re-scans every open library in the background
+and hands the tracks added and removed to the library's listeners, so
+live playlists pick up changes without reloading.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils.config import LIBRARY_CACHE_DIR, LIBRARY_WATCH_INTERVAL, LIBRARY_WATCH_MAX_LOAD
+from utils.log import get_logger
+
+log = get_logger('library')
+
+# The audio formats every player accepts
+SUPPORTED_FORMATS = ('.mp3', '.wav', '.ogg', '.flac')
+
+INDEX_VERSION = 1
+
+
+def is_audio_file(name):
+    return os.path.splitext(name)[1].lower() in SUPPORTED_FORMATS
+
+
+def cache_path(root, kind, cache_dir=LIBRARY_CACHE_DIR):
+    """Return the cache file of a given kind ('library', 'history') for the music folder `root`."""
+    digest = hashlib.sha1(os.path.normcase(os.path.abspath(root)).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"{kind}-{digest[:16]}.json")
+
+
+def index_path(root, cache_dir=LIBRARY_CACHE_DIR):
+    """Return the index file used for the music folder `root`."""
+    return cache_path(root, 'library', cache_dir)
+
+
+class MusicLibrary:
+    """Recursive, persisted index of the audio files under one music folder."""
+
+    def __init__(self, root, index_file=None):
+        self.root = os.path.abspath(root)
+        self.index_file = index_file or index_path(self.root)
+        # Directory path relative to root ('' for root) -> (mtime_ns, files, subdirs)
+        self._dirs = {}
+        self._tracks = None
+        self._lock = threading.RLock()
+        # Called with (added, removed) lists of full paths after a scan that found changes
+        self._listeners = []
+
+    def add_listener(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def __len__(self):
+        return len(self.tracks())
+
+    def load(self):
+        """Read the saved index. Returns False if there is none for this folder."""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != INDEX_VERSION or data.get('root') != self.root:
+            return False
+        with self._lock:
+            self._dirs = {path: (entry[0], entry[1], entry[2]) for path, entry in data['dirs'].items()}
+            self._tracks = None
+        return True
+
+    def save(self):
+        """Write the index atomically, so a crash never leaves a truncated file."""
+        with self._lock:
+            data = {
+                'version': INDEX_VERSION,
+                'root': self.root,
+                'dirs': {path: list(entry) for path, entry in self._dirs.items()},
+            }
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        temp_file = self.index_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, self.index_file)
+
+    def _list_dir(self, path):
+        """Return (audio files, subdirectories) of a directory, sorted."""
+        files, subdirs = [], []
+        with os.scandir(os.path.join(self.root, path)) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif is_audio_file(entry.name) and entry.is_file():
+                        files.append(entry.name)
+                except OSError:
+                    continue
+        files.sort()
+        subdirs.sort()
+        return files, subdirs
+
+    def scan(self):
+        """
+        Bring the index up to date with the folder.
+
+        :return: (changed, added, removed): whether the index changed at all,
+                 and the full paths of the tracks that appeared and disappeared
+        """
+        with self._lock:
+            old_dirs = self._dirs
+            new_dirs = {}
+            listed = 0
+            added, removed = [], []
+            pending = ['']
+            while pending:
+                path = pending.pop()
+                try:
+                    mtime = os.stat(os.path.join(self.root, path)).st_mtime_ns
+                except OSError:
+                    if path == '':
+                        raise
+                    continue
+                entry = old_dirs.get(path)
+                if entry is None or entry[0] != mtime:
+                    try:
+                        files, subdirs = self._list_dir(path)
+                    except OSError as e:
+                        log.warning("Could not list %s: %s", os.path.join(self.root, path), e)
+                        continue
+                    self._diff(path, old_dirs.get(path), files, added, removed)
+                    entry = (mtime, files, subdirs)
+                    listed += 1
+                new_dirs[path] = entry
+                pending.extend(os.path.join(path, name) for name in entry[2])
+
+            # Directories that are gone take their tracks with them
+            for path in old_dirs.keys() - new_dirs.keys():
+                self._diff(path, old_dirs[path], [], added, removed)
+
+            changed = listed > 0 or new_dirs.keys() != old_dirs.keys()
+            self._dirs = new_dirs
+            if changed:
+                self._tracks = None
+            log.debug("Scanned %s: %d director(ies), %d listed", self.root, len(new_dirs), listed)
+            return changed, added, removed
+
+    def _diff(self, path, old_entry, files, added, removed):
+        """Collect the tracks of one directory that were added or removed."""
+        old_files = set(old_entry[1]) if old_entry is not None else set()
+        new_files = set(files)
+        directory = os.path.join(self.root, path)
+        added.extend(os.path.join(directory, name) for name in sorted(new_files - old_files))
+        removed.extend(os.path.join(directory, name) for name in sorted(old_files - new_files))
+
+    def refresh(self):
+        """
+        Scan, save the index if it changed and tell the listeners about
+        added and removed tracks. Returns True if the index changed.
+        """
+        changed, added, removed = self.scan()
+        if changed:
+            try:
+                self.save()
+            except OSError as e:
+                log.warning("Could not save library index %s: %s", self.index_file, e)
+        if added or removed:
+            log.info("Library %s: %d track(s) added, %d removed", self.root, len(added), len(removed))
+            with self._lock:
+                listeners = list(self._listeners)
+            for listener in listeners:
+                try:
+                    listener(added, removed)
+                except Exception:
+                    log.exception("Error in library change listener")
+        return changed
+
+    def directories(self):
+        """Return (directory, audio file names) pairs for every directory holding tracks."""
+        with self._lock:
+            return [(os.path.join(self.root, path) if path else self.root, entry[1])
+                    for path, entry in sorted(self._dirs.items()) if entry[1]]
+
+    def tracks(self, relative=False):
+        """Return the indexed track paths, sorted; relative to the root if `relative`."""
+        with self._lock:
+            if self._tracks is None:
+                self._tracks = sorted(os.path.join(path, name)
+                                      for path, entry in self._dirs.items() for name in entry[1])
+            if relative:
+                return list(self._tracks)
+            return [os.path.join(self.root, track) for track in self._tracks]
+
+
+class LibraryWatcher:
+    """
+    Re-scans every open library on one background thread.
+
+    Scans run every `interval` seconds, but never take more than `max_load`
+    of the thread's time: after a scan that took t seconds the next one
+    waits at least t / max_load, so a huge or slow share is scanned less
+    often instead of keeping a core busy.
+    """
+
+    def __init__(self, interval=LIBRARY_WATCH_INTERVAL, max_load=LIBRARY_WATCH_MAX_LOAD):
+        self.interval = interval
+        self.max_load = max_load
+        self.scans = 0
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None or self.interval <= 0:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="library-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopped.set()
+            thread.join()
+
+    def _run(self):
+        delay = self.interval
+        while not self._stopped.wait(delay):
+            started = time.monotonic()
+            with _libraries_lock:
+                libraries = list(_libraries.values())
+            for library in libraries:
+                try:
+                    library.refresh()
+                except OSError as e:
+                    log.warning("Could not scan %s: %s", library.root, e)
+            self.scans += 1
+            elapsed = time.monotonic() - started
+            delay = max(self.interval, elapsed / self.max_load)
+
+
+_libraries = {}
+_libraries_lock = threading.Lock()
+watcher = LibraryWatcher()
+
+
+def get_library(root, refresh=True):
+    """
+    Return the shared MusicLibrary for a folder, opening it on first use.
+
+    The first call starts from the saved index and refreshes it; later
+    calls return the in-memory index without touching the disk.
+
+    :param refresh: With False a saved index is returned as it is, for the
+                    caller to refresh() later (e.g. off the startup path);
+                    a folder without one is still scanned
+    """
+    root = os.path.abspath(root)
+    with _libraries_lock:
+        library = _libraries.get(root)
+        if library is None:
+            if not os.path.isdir(root):
+                raise ValueError(f"Music folder {root} does not exist.")
+            library = MusicLibrary(root)
+            loaded = library.load()
+            if loaded:
+                log.info("Loaded library index for %s (%d tracks)", root, len(library))
+            if refresh or not loaded:
+                library.refresh()
+            _libraries[root] = library
+    watcher.start()
+    return library
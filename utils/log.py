@@ -0,0 +1,136 @@
+"""
+Logging for the music scheduler.
+
+Every module logs through get_logger(). Records always land in a bounded
+in-memory ring buffer that the UI and diagnostics can read with
+recent_events(); setup_logging() additionally sends them to the console
+and/or a log file. A shared filter rate-limits each call site, so a burst
+of identical messages (thousands of schedules firing at once, a failing
+track on every transition) cannot flood a slow console or pipe.
+"""
+import collections
+import logging
+import sys
+import threading
+
+from utils.config import LOG_BUFFER_SIZE, LOG_RATE_LIMIT_BURST, LOG_RATE_LIMIT_INTERVAL
+
+ROOT_LOGGER = 'music_scheduler'
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Allow at most `burst` records per call site (file and line) every
+    `interval` seconds. The first record after a quiet period reports how
+    many were dropped.
+    """
+
+    def __init__(self, burst=LOG_RATE_LIMIT_BURST, interval=LOG_RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        # The filter is shared by every handler; decide once per record
+        decision = getattr(record, '_rate_limit_allowed', None)
+        if decision is not None:
+            return decision
+        record._rate_limit_allowed = self._allow(record)
+        return record._rate_limit_allowed
+
+    def _allow(self, record):
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            state = self._sites.get(key)
+            if state is None or now - state[0] >= self.interval:
+                suppressed = state[2] if state is not None else 0
+                self._sites[key] = [now, 1, 0]
+            elif state[1] < self.burst:
+                state[1] += 1
+                suppressed = 0
+            else:
+                state[2] += 1
+                return False
+
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the most recent records in memory; formatting is deferred until read."""
+
+    def __init__(self, capacity=LOG_BUFFER_SIZE):
+        super().__init__()
+        self.records = collections.deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def get_events(self, limit=None, level=logging.NOTSET):
+        """Return recent records as dicts, oldest first."""
+        records = [record for record in list(self.records) if record.levelno >= level]
+        if limit is not None:
+            records = records[-limit:]
+        return [
+            {
+                'time': record.created,
+                'level': record.levelname,
+                'logger': record.name,
+                'message': record.getMessage(),
+            }
+            for record in records
+        ]
+
+
+_rate_limit = RateLimitFilter()
+ring_buffer = RingBufferHandler()
+ring_buffer.addFilter(_rate_limit)
+
+_root = logging.getLogger(ROOT_LOGGER)
+_root.setLevel(logging.INFO)
+_root.addHandler(ring_buffer)
+# Without setup_logging() records only go to the ring buffer
+_root.propagate = False
+
+
+def get_logger(name):
+    """Return the logger for a component, e.g. get_logger('scheduler')."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def setup_logging(debug=False, log_file=None, console=True):
+    """
+    Configure output for an application entry point.
+
+    :param debug: Log DEBUG records (per-schedule and per-track detail)
+    :param log_file: Also append records to this file
+    :param console: Log to stderr when there is one (windowed builds have none)
+    """
+    _root.setLevel(logging.DEBUG if debug else logging.INFO)
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    handlers = []
+    if console and sys.stderr is not None:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(_rate_limit)
+        _root.addHandler(handler)
+
+
+def logging_configured():
+    """Return whether output is already set up, e.g. inherited by a forked worker process."""
+    return any(isinstance(handler, logging.StreamHandler) for handler in _root.handlers)
+
+
+def recent_events(limit=100, level=logging.NOTSET):
+    """Return up to `limit` recent log records as dicts, oldest first."""
+    return ring_buffer.get_events(limit, level)
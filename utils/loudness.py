@@ -0,0 +1,107 @@
+"""
+Loudness normalisation.
+
+A background pass decodes every track once and computes a gain that
+brings its RMS level to LOUDNESS_TARGET_DBFS without pushing its peak
+past full scale. The math is vectorised with NumPy, and decoding goes
+through pygame in worker processes running SDL's dummy audio driver.
+Gains are cached by path, size and mtime next to the track metadata.
+At play time the player only multiplies the volume by the cached gain.
+"""
+import importlib.util
+import os
+import sys
+
+from utils.config import LIBRARY_CACHE_DIR, LOUDNESS_MAX_GAIN, LOUDNESS_MIN_GAIN, LOUDNESS_TARGET_DBFS
+from utils.log import get_logger
+from utils.metadata import POOL_THRESHOLD, MetadataCache
+
+log = get_logger('loudness')
+
+LOUDNESS_CACHE_FILE = os.path.join(LIBRARY_CACHE_DIR, 'loudness.json')
+
+# Samples summed per NumPy call, to keep memory flat on long tracks
+BLOCK_SAMPLES = 1 << 20
+
+
+def available():
+    """Return whether the analysis can run (NumPy is installed)."""
+    return importlib.util.find_spec('numpy') is not None
+
+
+def _init_decoder():
+    """Worker process initializer: a mixer that decodes without opening a sound device."""
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    import pygame
+    pygame.mixer.init(frequency=44100, size=-16, channels=2)
+
+
+def _can_decode_here():
+    """
+    Return whether this process has a 16-bit mixer open (the player's) that a
+    few tracks can be decoded with, instead of starting worker processes.
+    """
+    pygame = sys.modules.get('pygame')
+    if pygame is None:
+        return False
+    mixer_format = pygame.mixer.get_init()
+    return bool(mixer_format) and mixer_format[1] == -16
+
+
+def compute_gain(samples):
+    """
+    Return the gain for an array of 16-bit samples: the RMS level is moved to
+    the target, limited so the peak stays at or below full scale.
+    """
+    import numpy as np
+
+    samples = samples.reshape(-1)
+    if samples.size == 0:
+        return 1.0
+    energy = 0.0
+    peak = 0
+    for start in range(0, samples.size, BLOCK_SAMPLES):
+        raw = samples[start:start + BLOCK_SAMPLES]
+        # min/max of the raw block need no copy (abs() of int16 would overflow at -32768)
+        peak = max(peak, int(raw.max()), -int(raw.min()))
+        block = raw.astype(np.float32) / 32768.0
+        energy += float(np.dot(block, block))
+    peak /= 32768.0
+    rms = (energy / samples.size) ** 0.5
+    if rms <= 0.0 or peak <= 0.0:
+        return 1.0
+
+    gain = 10 ** (LOUDNESS_TARGET_DBFS / 20) / rms
+    gain = min(gain, 1.0 / peak)
+    return round(max(LOUDNESS_MIN_GAIN, min(LOUDNESS_MAX_GAIN, gain)), 4)
+
+
+def read_gain(path):
+    """Decode a track and return its normalisation gain, or None if it can't be decoded."""
+    import pygame
+
+    try:
+        samples = pygame.sndarray.array(pygame.mixer.Sound(path))
+    except (pygame.error, OSError, ValueError) as e:
+        log.debug("Could not decode %s: %s", path, e)
+        return None
+    return compute_gain(samples)
+
+
+# A few new songs are decoded with the player's mixer when it is open; a pool otherwise
+gain_cache = MetadataCache(LOUDNESS_CACHE_FILE, reader=read_gain, initializer=_init_decoder,
+                           pool_threshold=POOL_THRESHOLD, in_process=_can_decode_here)
+
+
+def cached_gain(path):
+    """Return a track's cached gain, or 1.0 if it hasn't been analysed."""
+    gain = gain_cache.get(path)
+    return gain if gain else 1.0
+
+
+def analyse_gains(paths, workers=None):
+    """Compute and cache the gains of the tracks that are new or changed."""
+    if not available():
+        log.warning("NumPy is not installed; loudness normalisation is off")
+        return {}
+    return gain_cache.analyse(paths, workers=workers)
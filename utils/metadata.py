@@ -0,0 +1,344 @@
+"""
+Track metadata: duration, sample rate, channels and bitrate.
+
+Headers are parsed with the standard library only (WAV, FLAC, Ogg
+Vorbis/Opus and MP3, including Xing/VBRI VBR headers). New or changed
+files are analysed in a process pool sized to the machine's cores;
+results are cached by path, size and mtime, so later runs only stat the
+files. Print what a folder contains with:
+
+    python -m utils.metadata path/to/music
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import struct
+import threading
+
+from utils.config import LIBRARY_CACHE_DIR
+from utils.log import get_logger, setup_logging
+
+log = get_logger('metadata')
+
+METADATA_CACHE_FILE = os.path.join(LIBRARY_CACHE_DIR, 'metadata.json')
+
+# Batches smaller than this are read in-process; a pool is not worth starting
+POOL_THRESHOLD = 16
+# The cache is saved after every this many analysed files, so a long first run keeps its progress
+SAVE_EVERY = 500
+
+
+def _metadata(fmt, duration, sample_rate, channels, bitrate=None):
+    return {
+        'format': fmt,
+        'duration': round(duration, 3),
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'bitrate': bitrate,
+    }
+
+
+def _read_wav(f, size):
+    riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+    if riff != b'RIFF' or wave != b'WAVE':
+        raise ValueError("not a RIFF/WAVE file")
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("no data chunk")
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack('<HHIIH', f.read(14))
+            f.seek(chunk_size - 14 + (chunk_size & 1), os.SEEK_CUR)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("data chunk before fmt chunk")
+            _, channels, sample_rate, byte_rate, _ = fmt
+            # Streams written without knowing their length leave the size open
+            data_size = min(chunk_size, size - f.tell())
+            return _metadata('wav', data_size / byte_rate, sample_rate, channels, byte_rate * 8)
+        else:
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def _read_flac(f, size):
+    if f.read(4) != b'fLaC':
+        raise ValueError("not a FLAC file")
+    block_header = f.read(4)
+    if block_header[0] & 0x7F != 0:
+        raise ValueError("first FLAC block is not STREAMINFO")
+    info = f.read(34)
+    packed = int.from_bytes(info[10:18], 'big')
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    duration = total_samples / sample_rate if sample_rate else 0.0
+    bitrate = round(size * 8 / duration) if duration else None
+    return _metadata('flac', duration, sample_rate, channels, bitrate)
+
+
+def _read_ogg(f, size):
+    page = f.read(4096)
+    if not page.startswith(b'OggS'):
+        raise ValueError("not an Ogg file")
+    segments = page[26]
+    packet = page[27 + segments:]
+    if packet.startswith(b'\x01vorbis'):
+        channels, sample_rate = struct.unpack('<BI', packet[11:16])
+        granule_rate, pre_skip, fmt = sample_rate, 0, 'ogg'
+    elif packet.startswith(b'OpusHead'):
+        channels, pre_skip, sample_rate = struct.unpack('<BHI', packet[9:16])
+        # Opus granule positions always count 48 kHz samples
+        granule_rate, fmt = 48000, 'opus'
+    else:
+        raise ValueError("unsupported Ogg codec")
+
+    # The last page's granule position is the stream length in samples
+    f.seek(max(0, size - 65536))
+    tail = f.read()
+    last_page = tail.rfind(b'OggS')
+    if last_page < 0 or last_page + 14 > len(tail):
+        raise ValueError("no final Ogg page")
+    granule = struct.unpack('<q', tail[last_page + 6:last_page + 14])[0]
+    duration = max(0, granule - pre_skip) / granule_rate
+    bitrate = round(size * 8 / duration) if duration else None
+    return _metadata(fmt, duration, sample_rate, channels, bitrate)
+
+
+# MPEG audio tables, indexed by [version][layer] (version: 3 == MPEG1, 2 == MPEG2, 0 == MPEG2.5)
+_MP3_BITRATES = {
+    (3, 3): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (3, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (3, 1): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 3): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 1): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _read_mp3(f, size):
+    start = 0
+    header = f.read(10)
+    if header.startswith(b'ID3'):
+        # Skip the ID3v2 tag; its size is a 28-bit "synchsafe" integer
+        start = 10 + (header[6] << 21 | header[7] << 14 | header[8] << 7 | header[9])
+        if header[5] & 0x10:
+            start += 10
+    end = size
+    f.seek(max(0, size - 128))
+    if f.read(3) == b'TAG':
+        end -= 128
+
+    # Find the first frame header within the first 64 KiB of audio
+    f.seek(start)
+    data = f.read(65536)
+    for offset in range(len(data) - 4):
+        if data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+            continue
+        b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+        version, layer = (b1 >> 3) & 0x3, (b1 >> 1) & 0x3
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x3
+        if version == 1 or layer == 0 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        break
+    else:
+        raise ValueError("no MPEG audio frame found")
+
+    bitrate = _MP3_BITRATES[(3 if version == 3 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    channels = 1 if b3 >> 6 == 3 else 2
+    if layer == 3:
+        samples_per_frame = 384
+    elif layer == 1 and version != 3:
+        samples_per_frame = 576
+    else:
+        samples_per_frame = 1152
+
+    # VBR files announce their frame count in a Xing/Info or VBRI header
+    frame = data[offset:offset + 200]
+    if version == 3:
+        side_info = 17 if channels == 1 else 32
+    else:
+        side_info = 9 if channels == 1 else 17
+    xing = frame[4 + side_info:4 + side_info + 12]
+    frames = None
+    if xing[:4] in (b'Xing', b'Info') and struct.unpack('>I', xing[4:8])[0] & 0x1:
+        frames = struct.unpack('>I', xing[8:12])[0]
+    elif frame[36:40] == b'VBRI':
+        frames = struct.unpack('>I', frame[50:54])[0]
+
+    audio_size = end - start - offset
+    if frames:
+        duration = frames * samples_per_frame / sample_rate
+        bitrate = round(audio_size * 8 / duration) if duration else bitrate
+    else:
+        duration = audio_size * 8 / bitrate
+    return _metadata('mp3', duration, sample_rate, channels, bitrate)
+
+
+_READERS = {
+    '.wav': _read_wav,
+    '.flac': _read_flac,
+    '.ogg': _read_ogg,
+    '.opus': _read_ogg,
+    '.mp3': _read_mp3,
+}
+
+
+def read_metadata(path):
+    """
+    Parse one file's header. Returns a dict with format, duration (seconds),
+    sample_rate, channels and bitrate (bits/s), or None if it can't be read.
+    """
+    reader = _READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        return None
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            return reader(f, size)
+    except (OSError, ValueError, KeyError, IndexError, struct.error, ZeroDivisionError) as e:
+        log.debug("Could not read metadata of %s: %s", path, e)
+        return None
+
+
+class MetadataCache:
+    """
+    Persisted per-file analysis results, keyed by path and checked against
+    size and mtime.
+
+    :param reader: Picklable function path -> JSON-compatible result (or None)
+    :param initializer: Run once in each worker process before reading
+    :param pool_threshold: Smaller batches are read in-process (0 always uses the pool)
+    :param in_process: Optional function telling whether the reader can run in this
+                       process right now; when it returns False the pool is used
+    """
+
+    def __init__(self, cache_file=METADATA_CACHE_FILE, reader=read_metadata, initializer=None,
+                 pool_threshold=POOL_THRESHOLD, in_process=None):
+        self.cache_file = cache_file
+        self.reader = reader
+        self.initializer = initializer
+        self.pool_threshold = pool_threshold
+        self.in_process = in_process
+        # path -> (size, mtime_ns, metadata)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        with self._lock:
+            self._entries = {path: tuple(entry) for path, entry in entries.items()}
+            self._loaded = True
+
+    def save(self):
+        with self._lock:
+            entries = {path: list(entry) for path, entry in self._entries.items()}
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temp_file = self.cache_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, self.cache_file)
+
+    def get(self, path):
+        """Return the cached result for `path`, or None if it isn't cached."""
+        if not self._loaded:
+            self.load()
+        with self._lock:
+            entry = self._entries.get(path)
+        return entry[2] if entry is not None else None
+
+    def analyse(self, paths, workers=None):
+        """
+        Return a path -> metadata mapping for `paths`, reading only the files
+        that are new or changed since they were cached.
+
+        :param workers: Worker processes for the analysis (defaults to the number of cores)
+        """
+        if not self._loaded:
+            self.load()
+
+        results, stale = {}, []
+        with self._lock:
+            for path in paths:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                key = (stat.st_size, stat.st_mtime_ns)
+                entry = self._entries.get(path)
+                if entry is not None and entry[:2] == key:
+                    results[path] = entry[2]
+                else:
+                    stale.append((path, key))
+
+        if not stale:
+            return results
+
+        log.info("Analysing %d new or changed file(s) for %s", len(stale), os.path.basename(self.cache_file))
+        if len(stale) < self.pool_threshold and (self.in_process is None or self.in_process()):
+            self._store(stale, map(self.reader, [path for path, _ in stale]), results)
+            return results
+
+        workers = workers or os.cpu_count() or 1
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=self.initializer) as executor:
+            for start in range(0, len(stale), SAVE_EVERY):
+                batch = stale[start:start + SAVE_EVERY]
+                analysed = executor.map(self.reader, [path for path, _ in batch],
+                                        chunksize=max(1, len(batch) // (workers * 4)))
+                self._store(batch, analysed, results)
+        return results
+
+    def _store(self, batch, analysed, results):
+        """Record a batch of results and save the cache."""
+        with self._lock:
+            for (path, key), result in zip(batch, analysed):
+                self._entries[path] = (key[0], key[1], result)
+                results[path] = result
+        try:
+            self.save()
+        except OSError as e:
+            log.warning("Could not save cache %s: %s", self.cache_file, e)
+
+    def prune(self, paths):
+        """Forget cached files that are not in `paths`."""
+        keep = set(paths)
+        with self._lock:
+            self._entries = {path: entry for path, entry in self._entries.items() if path in keep}
+
+
+metadata_cache = MetadataCache()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse the tracks in a music folder")
+    parser.add_argument('folder', help="music folder")
+    parser.add_argument('--workers', type=int, help="worker processes (defaults to the number of cores)")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    from utils.library import MusicLibrary
+
+    library = MusicLibrary(args.folder)
+    library.load()
+    library.refresh()
+    tracks = library.tracks()
+    metadata = metadata_cache.analyse(tracks, workers=args.workers)
+
+    unreadable = [track for track in tracks if metadata.get(track) is None]
+    total = sum(entry['duration'] for entry in metadata.values() if entry is not None)
+    print(f"{len(tracks)} tracks, {total / 3600:.1f} hours, {len(unreadable)} unreadable")
+    for track in unreadable:
+        print(f"  unreadable: {track}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,111 +1,443 @@
+import collections
 import os
 import random
-import pygame
 import threading
-import time
+
+from utils.clock import system_clock
+from utils.config import PLAN_TOLERANCE_SECONDS, PLAY_HISTORY_SIZE
+from utils.library import cache_path, get_library
+from utils.log import get_logger
+from utils.loudness import analyse_gains, cached_gain
+from utils.metadata import metadata_cache
+from utils.planner import plan_window
+from utils.playlist import PlayHistory, Playlist, ShuffleOrder
+
+log = get_logger('player')
+
+# Draws spent looking for a song that is not in the recent history
+NO_REPEAT_ATTEMPTS = 8
+# Save the play history after this many songs (and whenever playback stops)
+HISTORY_SAVE_EVERY = 10
+
+
+def cached_duration(path):
+    """Return a track's length in seconds from the metadata cache, or None if unknown."""
+    metadata = metadata_cache.get(path)
+    return metadata['duration'] if metadata else None
+
+
+def _analyse_tracks(tracks):
+    """Background pass: learn track lengths first (cheap), then loudness gains."""
+    metadata_cache.analyse(tracks)
+    analyse_gains(tracks)
+
 
 class MusicPlayer:
-    def __init__(self, volume=0.7):
-        pygame.mixer.init()
+    def __init__(self, volume=0.7, clock=None, backend=None, seed=None, track_duration=None,
+                 track_gain=None):
+        """
+        :param track_duration: Function returning a track's length in seconds (or None),
+                               used to plan stop_duration windows; defaults to the metadata cache
+        :param track_gain: Function returning a track's loudness gain; defaults to the loudness cache
+        """
+        if backend is None:
+            # pygame is only needed for real audio output
+            from utils.audio_backend import PygameBackend
+            backend = PygameBackend()
+        self.clock = clock or system_clock
+        self.backend = backend
+        self.backend.on_track_end = self._on_track_end
         self.volume = volume
-        self.current_playlist = []
-        self.current_song_index = -1
-        self._playback_thread = None
-        self._stop_playback = False
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._playing = False
         self._stop_duration = 0  # Duration to stop playback in minutes
         self._stop_timer = None
+        self.library = None
+        # Cleared while load_playlist(background=True) runs; a fire that comes
+        # in meanwhile is kept as (stop_duration, monotonic time of the fire)
+        self._loaded = threading.Event()
+        self._loaded.set()
+        self._start_when_loaded = None
+
+        # Songs are drawn one at a time from a lazily shuffled order; the
+        # one after the current song is drawn early so it can be preloaded
+        self.playlist = Playlist()
+        self.history = PlayHistory(PLAY_HISTORY_SIZE)
+        self._order = ShuffleOrder(self.playlist, self._random)
+        self.current_song = None
+        self._upcoming = None
+        self._history_unsaved = 0
+        # Optional callback(path) run whenever a song starts, e.g. to show it in a UI
+        self.on_track_start = None
+
+        # Plans computed ahead of a fire, by stop duration, and the planned
+        # songs left in the running session (None when it has no plan)
+        self._track_duration = track_duration or cached_duration
+        self._track_gain = track_gain or cached_gain
+        self._current_gain = 1.0
+        self._prepared = {}
+        self._planned = None
+
+        # Each shuffle_and_play() starts a new playback session; a stop timer
+        # only ends the session that armed it
+        self.session = 0
+
+        # Silence between consecutive tracks, as measured by the backend.
+        # Only transitions the player started itself are measured; tracks the
+        # mixer took over from its queue are counted as gapless_transitions
+        self.stats = {
+            'transitions': 0,
+            'gapless_transitions': 0,
+            'total_gap': 0.0,
+            'max_gap': 0.0,
+            'max_stop_latency': 0.0,
+            'last_plan_fit': None,
+        }
 
     def set_volume(self, volume):
         """Set the volume of the music player."""
-        self.volume = volume
-        pygame.mixer.music.set_volume(volume)
-
-    def load_playlist(self, music_folder):
-        """Load all music files from a specified folder."""
-        if not os.path.exists(music_folder):
-            raise ValueError(f"Music folder {music_folder} does not exist.")
-        
-        # Support multiple audio formats
-        supported_formats = ['.mp3', '.wav', '.ogg', '.flac']
-        
-        self.current_playlist = [
-            os.path.join(music_folder, song) 
-            for song in os.listdir(music_folder) 
-            if os.path.splitext(song)[1].lower() in supported_formats
-        ]
-        
-        random.shuffle(self.current_playlist)
-        self.current_song_index = 0
-
-    def _stop_after_duration(self):
-        """Stop playback after specified duration."""
-        time.sleep(self._stop_duration * 60)  # Convert minutes to seconds
-        self.stop()
-
-    def _continuous_playback(self):
-        """Manage continuous playback of songs in the playlist."""
-        self._stop_playback = False
-        
-        # Start stop timer if duration is set
-        if self._stop_duration > 0:
-            self._stop_timer = threading.Thread(target=self._stop_after_duration, daemon=True)
-            self._stop_timer.start()
-        
-        while not self._stop_playback and self.current_playlist:
+        with self._lock:
+            self.volume = volume
+            self.backend.set_volume(self._output_volume(self._current_gain))
+
+    def _output_volume(self, gain):
+        """The player's volume with a track's loudness gain applied."""
+        return min(1.0, self.volume * gain)
+
+    def load_playlist(self, music_folder, background=False):
+        """
+        Load all music files from a specified folder and its subfolders.
+
+        The playlist then follows the folder: songs added or deleted later
+        are added to or dropped from it as the library notices them. It
+        starts from the library's saved index when there is one, and the
+        folder is re-scanned in the background.
+
+        :param background: Load on a background thread and return at once; a
+                           fire that comes in meanwhile starts playback once it is done
+        """
+        if background:
+            self._loaded.clear()
+            threading.Thread(target=self._load_in_background, args=(music_folder,),
+                             name="playlist-load", daemon=True).start()
+            return
+
+        library = get_library(music_folder, refresh=False)
+        playlist = Playlist()
+        for directory, names in library.directories():
+            # Shares the library's name strings instead of building paths
+            playlist.add_dir(directory, names)
+        history = PlayHistory(PLAY_HISTORY_SIZE, cache_path(library.root, 'history'))
+
+        with self._lock:
+            if self.library is not None:
+                self.library.remove_listener(self._on_library_change)
+            self.library = library
+            library.add_listener(self._on_library_change)
+            self.history.save()
+            self.history = history
+            self._use_playlist(playlist)
+        # Catch up with changes since the index was saved, then learn the
+        # track lengths (for planning) and loudness in the background
+        threading.Thread(target=self._refresh_library, args=(library,),
+                         name="track-analysis", daemon=True).start()
+
+    def _load_in_background(self, music_folder):
+        try:
+            self.load_playlist(music_folder)
+        except Exception as e:
+            log.error("Could not load music folder %s: %s", music_folder, e)
+        finally:
+            with self._lock:
+                self._loaded.set()
+                pending, self._start_when_loaded = self._start_when_loaded, None
+            if pending is not None:
+                self._start_late(*pending)
+
+    def _refresh_library(self, library):
+        try:
+            library.refresh()
+        except OSError as e:
+            log.warning("Could not scan %s: %s", library.root, e)
+        _analyse_tracks(library.tracks())
+
+    def _start_late(self, stop_duration, fired_at):
+        """Start the playback of a fire that came in while the playlist was loading."""
+        if stop_duration > 0:
+            # The session still ends when the fire's window does
+            stop_duration -= (self.clock.monotonic() - fired_at) / 60
+            if stop_duration <= 0:
+                log.warning("Playlist loaded after the schedule's window had passed; not playing")
+                return
+        self.shuffle_and_play(stop_duration)
+
+    def set_playlist(self, tracks):
+        """Replace the playlist with the given track paths."""
+        with self._lock:
+            self._use_playlist(Playlist(tracks))
+
+    def _use_playlist(self, playlist):
+        """Switch to a new playlist. Caller must hold the lock."""
+        self.playlist = playlist
+        self._order = ShuffleOrder(playlist, self._random)
+        self._upcoming = None
+        self._planned = None
+        self._prepared = {}
+
+    def _on_library_change(self, added, removed):
+        """Library listener: apply added and removed songs without reshuffling."""
+        with self._lock:
+            if removed:
+                self.playlist.remove(removed)
+                if self.playlist.needs_compaction():
+                    self._compact()
+            if added:
+                # New songs join the part of the shuffle not yet played
+                self.playlist.add(added)
+            if not len(self.playlist):
+                self.stop()
+        if added:
+            # Reading the new songs can take a while; keep it off the watcher thread
+            threading.Thread(target=_analyse_tracks, args=(added,),
+                             name="track-analysis", daemon=True).start()
+
+    def _compact(self):
+        """Renumber the playlist; ids held for the session are dropped. Caller must hold the lock."""
+        self.playlist.compact()
+        self._order.restart()
+        self._upcoming = None
+        self._planned = None
+        self._prepared = {}
+
+    def _draw(self):
+        """Return the next song id of the shuffle, avoiding recently played songs."""
+        # Only avoid the history when there is plenty else to play
+        avoid = len(self.playlist) > 2 * len(self.history)
+        track_id = None
+        for attempt in range(NO_REPEAT_ATTEMPTS):
+            track_id = self._order.next()
+            if track_id is None or not avoid or self.playlist.path(track_id) not in self.history:
+                break
+        return track_id
+
+    def _next_id(self):
+        """
+        Return the id of the song after the current one, or None when there is
+        none. A planned session has none once its plan is used up: it ends on
+        that song boundary instead of starting a song the stop timer would cut.
+        """
+        if self._planned is not None:
+            while self._planned and not self.playlist.is_live(self._planned[0]):
+                self._planned.popleft()
+            return self._planned.popleft() if self._planned else None
+        return self._draw()
+
+    def _play_current(self, track_id, ended_at=None):
+        """
+        Start a song and preload the one after it. Caller must hold the lock.
+
+        :param ended_at: Backend time the previous song ended, to measure the gap
+        """
+        # Skip songs that fail to play; give up once every song has failed
+        failures = 0
+        while True:
+            if track_id is None:
+                if self._planned is not None:
+                    log.info("Planned songs finished, ending the session")
+                else:
+                    log.error("No playable songs left, stopping playback")
+                self.stop()
+                return
+            current_song = self.playlist.path(track_id)
+            log.info("Playing song: %s", current_song)
+            self.clock.record('track_start', track=os.path.basename(current_song))
             try:
-                # Play current song
-                current_song = self.current_playlist[self.current_song_index]
-                print(f"MUSIC PLAYER: Playing song: {current_song}")
-                
-                pygame.mixer.music.load(current_song)
-                pygame.mixer.music.set_volume(self.volume)
-                pygame.mixer.music.play()
-                
-                # Wait for the song to finish
-                while pygame.mixer.music.get_busy() and not self._stop_playback:
-                    time.sleep(1)
-                
-                # Move to next song if not stopped
-                if not self._stop_playback:
-                    self.current_song_index = (self.current_song_index + 1) % len(self.current_playlist)
-            
-            except Exception as e:
-                print(f"MUSIC PLAYER: Error during playback: {e}")
+                # The gain was computed ahead of time; applying it costs nothing here
+                gain = self._track_gain(current_song)
+                started_at = self.backend.play(current_song, self._output_volume(gain),
+                                               self._track_duration(current_song))
+                self._current_gain = gain
                 break
+            except Exception as e:
+                log.error("Error during playback of %s: %s", current_song, e)
+                failures += 1
+                if not os.path.exists(current_song):
+                    # Deleted since the library last looked; drop it for good
+                    self.playlist.remove([current_song])
+                elif failures >= len(self.playlist):
+                    log.error("No playable songs left, stopping playback")
+                    self.stop()
+                    return
+                track_id = self._next_id()
+
+        self.current_song = current_song
+        if self.on_track_start is not None:
+            try:
+                self.on_track_start(current_song)
+            except Exception:
+                log.exception("Error in track start handler")
+        self.history.add(current_song)
+        self._history_unsaved += 1
+        if self._history_unsaved >= HISTORY_SAVE_EVERY:
+            self._history_unsaved = 0
+            self.history.save()
+
+        if ended_at is not None:
+            if started_at is not None:
+                self._record_gap(max(0.0, started_at - ended_at))
+            else:
+                self.stats['gapless_transitions'] += 1
+
+        # Read the next song while this one plays (unless the plan ends here)
+        self._upcoming = self._next_id()
+        if self._upcoming is not None:
+            upcoming_song = self.playlist.path(self._upcoming)
+            # Its gain decides whether the mixer may switch to it on its own
+            self.backend.preload(upcoming_song, self._track_duration(upcoming_song),
+                                 self._output_volume(self._track_gain(upcoming_song)))
+
+    def _record_gap(self, gap):
+        self.stats['transitions'] += 1
+        self.stats['total_gap'] += gap
+        self.stats['max_gap'] = max(self.stats['max_gap'], gap)
+        log.debug("Track transition gap: %.1f ms", gap * 1000)
+
+    def get_stats(self):
+        """
+        Return playback counters: transitions (measured), total_gap, max_gap
+        and max_stop_latency (seconds), gapless_transitions (queued on the
+        mixer, not measurable) and last_plan_fit (0..1).
+        """
+        with self._lock:
+            return dict(self.stats)
+
+    def _on_track_end(self, ended_at=None):
+        """Backend callback: the current song finished, move on to the next one."""
+        with self._lock:
+            if not self._playing:
+                return
+            track_id, self._upcoming = self._upcoming, None
+            if track_id is None or not self.playlist.is_live(track_id):
+                track_id = self._next_id()
+            self._play_current(track_id, ended_at)
+
+    def _plan(self, stop_duration):
+        """Plan the songs of a stop_duration window, or return None if none fit."""
+        with self._lock:
+            playlist, generation = self.playlist, self.playlist.generation
+            avoid = len(playlist) > 2 * len(self.history)
+            paths = [(track_id, playlist.path(track_id)) for track_id in playlist.ids()]
+        candidates = []
+        for track_id, path in paths:
+            if avoid and path in self.history:
+                continue
+            duration = self._track_duration(path)
+            if duration:
+                candidates.append((track_id, duration))
+        with self._lock:
+            return playlist, generation, plan_window(candidates, stop_duration * 60, self._random)
+
+    def prepare(self, stop_duration):
+        """Plan the songs for an upcoming fire, so the fire itself does no planning."""
+        # While the playlist loads, the fire plans for itself
+        if stop_duration <= 0 or not self._loaded.is_set():
+            return
+        prepared = self._plan(stop_duration)
+        with self._lock:
+            self._prepared[stop_duration] = prepared
 
     def shuffle_and_play(self, stop_duration=0):
         """
-        Shuffle the playlist and start continuous playback.
-        
+        Start continuous playback in shuffled order.
+
+        The shuffle is drawn lazily, so starting costs the same however
+        large the playlist is, and recently played songs are avoided.
+
         :param stop_duration: Duration to play music in minutes (0 means play indefinitely)
         """
-        if not self.current_playlist:
-            print("MUSIC PLAYER: No music loaded. Use load_playlist() first.")
-            return
-        
-        # Stop any existing playback
-        self.stop()
-        
-        # Set stop duration
-        self._stop_duration = stop_duration
-        
-        # Shuffle the playlist
-        random.shuffle(self.current_playlist)
-        
-        # Reset to the first song
-        self.current_song_index = 0
-        
-        # Start continuous playback in a separate thread
-        self._playback_thread = threading.Thread(target=self._continuous_playback, daemon=True)
-        self._playback_thread.start()
+        with self._lock:
+            if not self._loaded.is_set():
+                # Called on the clock's shared timer thread, which must not wait
+                # for a slow folder; start when the load finishes instead
+                log.info("Playlist still loading; playback starts once it has loaded")
+                self._start_when_loaded = (stop_duration, self.clock.monotonic())
+                return
+            if not len(self.playlist):
+                log.warning("No music loaded. Use load_playlist() first.")
+                return
+
+            # Stop any existing playback
+            self.stop()
+
+            # Set stop duration
+            self._stop_duration = stop_duration
+
+            # Fill a timed window with whole songs when their lengths are known
+            self._planned = None
+            if stop_duration > 0:
+                prepared = self._prepared.pop(stop_duration, None)
+                if prepared is None or prepared[0] is not self.playlist \
+                        or prepared[1] != self.playlist.generation:
+                    prepared = self._plan(stop_duration)
+                plan = prepared[2]
+                # A plan ends the session with its last song, at most the
+                # tolerance before the window closes. One that leaves more of
+                # the window empty (too few songs, or lengths not known yet)
+                # would end early; play shuffled and let the stop timer end it
+                if plan is not None and plan.shortfall <= PLAN_TOLERANCE_SECONDS:
+                    self._start_plan(plan)
+                elif plan is not None:
+                    log.info("Plan fills only %.1f%% of the window, playing shuffled", plan.fit * 100)
+                    self.stats['last_plan_fit'] = plan.fit
+
+            self._upcoming = None
+            self._playing = True
+            self.session += 1
+            session = self.session
+
+            # Stop timer if duration is set, on the clock's shared timer thread
+            if self._stop_duration > 0:
+                self._stop_timer = self.clock.call_later(self._stop_duration * 60,
+                                                         lambda: self._end_session(session))
+
+            # Playback continues from the backend's end-of-track callback
+            self._play_current(self._next_id())
+
+    def _start_plan(self, plan):
+        """Queue a plan's songs for this session. Caller must hold the lock."""
+        self._planned = collections.deque(plan.tracks)
+        self.stats['last_plan_fit'] = plan.fit
+        log.info("Planned %d song(s): %.0fs of a %.0fs window (%.1f%%)",
+                 len(plan.tracks), plan.total, plan.window, plan.fit * 100)
+        self.clock.record('plan', tracks=len(plan.tracks), fill=f"{plan.fit:.3f}")
+
+    def _end_session(self, session):
+        """Stop timer callback: end playback unless a newer session has replaced it."""
+        with self._lock:
+            if session != self.session:
+                log.debug("Ignoring stop timer of session %d (now %d)", session, self.session)
+                return
+            self._stop_timer = None
+            self.stop()
 
     def stop(self):
         """Stop the current music playback."""
-        self._stop_playback = True
-        
-        # Wait for playback thread to finish
-        if self._playback_thread and self._playback_thread.is_alive():
-            self._playback_thread.join()
-        
-        # Stop pygame music
-        pygame.mixer.music.stop()
+        started = self.clock.monotonic()
+        with self._lock:
+            was_playing = self._playing
+            self._playing = False
+            self._start_when_loaded = None
+            self._planned = None
+            self._upcoming = None
+
+            if self._stop_timer is not None:
+                self._stop_timer.cancel()
+                self._stop_timer = None
+
+            self.backend.stop()
+            if was_playing:
+                self.clock.record('stop', session=self.session)
+                latency = self.clock.monotonic() - started
+                self.stats['max_stop_latency'] = max(self.stats['max_stop_latency'], latency)
+                self.history.save()
@@ -0,0 +1,92 @@
+"""
+Duration-aware playlist planning.
+
+A schedule with a stop_duration plays for a fixed window. Instead of
+cutting the last song off when the window closes, plan_window() picks a
+shuffled set of whole tracks whose lengths add up to just under the
+window: a greedy pass over a shuffled library, then a bounded swap pass
+that trades chosen tracks for slightly longer unused ones to close the
+remaining gap. Both passes are O(n log n) at worst, so a 10k+ track
+library plans in milliseconds.
+"""
+import bisect
+
+from utils.config import PLAN_TOLERANCE_SECONDS
+
+
+class Plan:
+    """Tracks chosen for a window and how well they fill it (all times in seconds)."""
+
+    __slots__ = ('tracks', 'total', 'window')
+
+    def __init__(self, tracks, total, window):
+        self.tracks = tracks
+        self.total = total
+        self.window = window
+
+    @property
+    def shortfall(self):
+        """Seconds of the window left unfilled."""
+        return self.window - self.total
+
+    @property
+    def fit(self):
+        """Fraction of the window filled, 0..1."""
+        return self.total / self.window if self.window else 0.0
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __repr__(self):
+        return f"Plan({len(self.tracks)} tracks, {self.total:.0f}s of {self.window:.0f}s, fit={self.fit:.3f})"
+
+
+def plan_window(candidates, window, rng, tolerance=PLAN_TOLERANCE_SECONDS):
+    """
+    Choose a random set of whole tracks that fills `window` seconds.
+
+    :param candidates: (track, duration in seconds) pairs to choose from
+    :param window: Length of the window in seconds
+    :param rng: random.Random used for the shuffle
+    :param tolerance: Stop improving once the unfilled part is shorter than this
+    :return: A Plan, or None if not even one track fits
+    """
+    order = list(candidates)
+    rng.shuffle(order)
+
+    # Greedy pass: take tracks in shuffled order while they still fit
+    chosen, unused = [], []
+    total = 0.0
+    for position, (track, duration) in enumerate(order):
+        if total + duration <= window:
+            chosen.append((track, duration))
+            total += duration
+            if window - total < tolerance:
+                break
+        else:
+            unused.append((duration, track))
+    if not chosen:
+        return None
+
+    # Swap pass: replace a chosen track by the longest unused one that
+    # still fits in its place plus the gap. Each swap only shrinks the gap.
+    gap = window - total
+    if gap >= tolerance and unused:
+        unused.sort()
+        durations = [duration for duration, _ in unused]
+        for i, (track, duration) in enumerate(chosen):
+            j = bisect.bisect_right(durations, duration + gap) - 1
+            if j < 0 or durations[j] <= duration:
+                continue
+            longer_duration, longer_track = unused.pop(j)
+            del durations[j]
+            chosen[i] = (longer_track, longer_duration)
+            k = bisect.bisect_left(durations, duration)
+            unused.insert(k, (duration, track))
+            durations.insert(k, duration)
+            total += longer_duration - duration
+            gap = window - total
+            if gap < tolerance:
+                break
+
+    return Plan([track for track, _ in chosen], total, window)
@@ -0,0 +1,208 @@
+"""
+Compact playlists for very large libraries.
+
+A Playlist keeps each directory once and each track as a directory number
+(in an array of 32-bit ints) plus its file name, instead of one full path
+string per track. Tracks are addressed by integer ids; removed tracks
+leave a hole that is compacted away once holes outnumber tracks. An index
+from (directory number, name) to id makes removing tracks cost as much as
+the tracks removed, not the whole playlist.
+
+ShuffleOrder hands out the tracks in random order one at a time with an
+incremental Fisher-Yates shuffle: each draw is O(1) and starting over is
+O(1), however large the playlist. A PlayHistory remembers the most
+recently played tracks (optionally on disk) so a new session does not
+repeat them.
+"""
+import collections
+import json
+import os
+import threading
+from array import array
+
+from utils.log import get_logger
+
+log = get_logger('playlist')
+
+
+class Playlist:
+    """Track paths stored as interned directories plus file names, addressed by id."""
+
+    def __init__(self, tracks=()):
+        self._dirs = []
+        self._dir_ids = {}
+        self._dir_of = array('I')
+        self._names = []
+        self._index = {}
+        self._live = 0
+        # Bumped whenever ids are renumbered, so holders of ids know to let go
+        self.generation = 0
+        self.add(tracks)
+
+    def __len__(self):
+        return self._live
+
+    @property
+    def capacity(self):
+        """Number of ids in use, including holes."""
+        return len(self._names)
+
+    def _dir_id(self, directory):
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self._dirs)
+            self._dirs.append(directory)
+        return dir_id
+
+    def add_dir(self, directory, names):
+        """Add the files `names` of one directory; the name strings are kept as given."""
+        dir_id = self._dir_id(directory)
+        for name in names:
+            self._index[(dir_id, name)] = len(self._names)
+            self._dir_of.append(dir_id)
+            self._names.append(name)
+        self._live += len(names)
+
+    def add(self, paths):
+        """Add tracks by full path."""
+        for path in paths:
+            directory, name = os.path.split(path)
+            self.add_dir(directory, (name,))
+
+    def remove(self, paths):
+        """Remove tracks by full path. Returns the ids that were removed."""
+        removed = []
+        for path in paths:
+            directory, name = os.path.split(path)
+            dir_id = self._dir_ids.get(directory)
+            if dir_id is None:
+                continue
+            track_id = self._index.pop((dir_id, name), None)
+            if track_id is not None:
+                self._names[track_id] = None
+                removed.append(track_id)
+        self._live -= len(removed)
+        return removed
+
+    def is_live(self, track_id):
+        return track_id < len(self._names) and self._names[track_id] is not None
+
+    def path(self, track_id):
+        return os.path.join(self._dirs[self._dir_of[track_id]], self._names[track_id])
+
+    def ids(self):
+        """Iterate over the ids of the tracks in the playlist."""
+        return (track_id for track_id, name in enumerate(self._names) if name is not None)
+
+    def paths(self):
+        return [self.path(track_id) for track_id in self.ids()]
+
+    def needs_compaction(self):
+        return len(self._names) - self._live > max(self._live, 1024)
+
+    def compact(self):
+        """Drop the holes left by removed tracks. Renumbers ids."""
+        keep = list(self.ids())
+        self._dir_of = array('I', (self._dir_of[track_id] for track_id in keep))
+        self._names = [self._names[track_id] for track_id in keep]
+        self._index = {(dir_id, name): track_id
+                       for track_id, (dir_id, name) in enumerate(zip(self._dir_of, self._names))}
+        self.generation += 1
+
+
+class ShuffleOrder:
+    """
+    Random order over a Playlist, generated one track at a time.
+
+    This is Fisher-Yates run lazily: only the positions touched so far are
+    stored (in a dict), so a draw and a restart are both O(1). Tracks added
+    to the playlist mid-round land in the not-yet-drawn part and are drawn
+    this round; removed tracks are skipped.
+    """
+
+    def __init__(self, playlist, rng):
+        self.playlist = playlist
+        self.rng = rng
+        self._position = 0
+        self._swaps = {}
+
+    def restart(self):
+        self._position = 0
+        self._swaps = {}
+
+    def next(self):
+        """Return the next track id, starting a new round when this one is used up, or None if empty."""
+        if not len(self.playlist):
+            return None
+        while True:
+            size = self.playlist.capacity
+            if self._position >= size:
+                self.restart()
+            position = self._position
+            pick = self.rng.randrange(position, size)
+            track_id = self._swaps.get(pick, pick)
+            # Move the track at `position` into the slot just drawn from;
+            # `position` itself is never looked at again
+            moved = self._swaps.pop(position, position)
+            if pick != position:
+                self._swaps[pick] = moved
+            self._position += 1
+            if self.playlist.is_live(track_id):
+                return track_id
+
+
+class PlayHistory:
+    """The most recently played track paths, optionally persisted to a JSON file."""
+
+    def __init__(self, limit, history_file=None):
+        self.limit = limit
+        self.history_file = history_file
+        self._recent = collections.deque(maxlen=limit)
+        self._members = collections.Counter()
+        self._dirty = False
+        self._lock = threading.Lock()
+        if history_file:
+            self.load()
+
+    def __contains__(self, path):
+        return self._members[path] > 0
+
+    def __len__(self):
+        return len(self._recent)
+
+    def add(self, path):
+        with self._lock:
+            if len(self._recent) == self._recent.maxlen:
+                oldest = self._recent[0]
+                self._members[oldest] -= 1
+                if not self._members[oldest]:
+                    del self._members[oldest]
+            self._recent.append(path)
+            self._members[path] += 1
+            self._dirty = True
+
+    def load(self):
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                paths = json.load(f)
+        except (OSError, ValueError):
+            return
+        for path in paths[-self.limit:]:
+            self.add(path)
+        self._dirty = False
+
+    def save(self):
+        """Write the history if it changed since the last save."""
+        if not self.history_file or not self._dirty:
+            return
+        with self._lock:
+            paths = list(self._recent)
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
+            temp_file = self.history_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(paths, f, ensure_ascii=False)
+            os.replace(temp_file, self.history_file)
+        except OSError as e:
+            log.warning("Could not save play history %s: %s", self.history_file, e)
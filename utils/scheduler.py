@@ -1,95 +1,549 @@
-import schedule
-import time
+import heapq
+import itertools
+import logging
 import threading
-from datetime import datetime
+from datetime import timedelta
+
+from utils.clock import system_clock
+from utils.config import CATCH_UP_SECONDS, CLOCK_JUMP_SECONDS, LATE_FIRE_SECONDS
+from utils.holidays import SKIP
+from utils.log import get_logger
+
+log = get_logger('scheduler')
+
+# Weekday names in datetime.weekday() order (Monday == 0)
+DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+HEBREW_DAY_NAMES = ('שני', 'שלישי', 'רביעי', 'חמישי', 'שישי', 'שבת', 'ראשון')
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+ALL_DAYS = 0b1111111
+
+# Every spelling of a weekday accepted when loading schedules, lower-cased
+DAY_ALIASES = {}
+for _weekday, _name in enumerate(DAY_NAMES):
+    DAY_ALIASES[_name.lower()] = _weekday
+    DAY_ALIASES[_name[:3].lower()] = _weekday
+    DAY_ALIASES[HEBREW_DAY_NAMES[_weekday]] = _weekday
+    DAY_ALIASES['יום ' + HEBREW_DAY_NAMES[_weekday]] = _weekday
+del _weekday, _name
+
+
+def parse_days(days):
+    """
+    Convert a list of day names (English or Hebrew, any case) or weekday
+    numbers (Monday == 0) into a 7-bit mask. An empty list means every day.
+    """
+    if not days:
+        return ALL_DAYS
+    mask = 0
+    for day in days:
+        if isinstance(day, int):
+            weekday = day if 0 <= day < 7 else None
+        else:
+            weekday = DAY_ALIASES.get(day.strip().lower())
+        if weekday is None:
+            log.warning("Ignoring unknown day %r", day)
+            continue
+        mask |= 1 << weekday
+    return mask
+
+
+def parse_time(time_str):
+    """Convert 'HH:MM' into minute-of-day."""
+    hours, minutes = time_str.split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 23 and 0 <= minutes <= 59):
+        raise ValueError(f"Invalid time {time_str!r}")
+    return hours * 60 + minutes
+
+
+class ScheduleRecord:
+    """
+    One schedule: minute-of-day, a weekday bitmask (bit 0 == Monday), the
+    stop duration in minutes and the zones it plays in.
+
+    Schedules with a `group` only play on dates that a calendar exception
+    replaces with that group; the regular schedules have none.
+    """
+
+    __slots__ = ('minute', 'days', 'stop_duration', 'zones', 'group')
+
+    def __init__(self, minute, days=ALL_DAYS, stop_duration=0, zones=(), group=None):
+        self.minute = minute
+        self.days = days
+        self.stop_duration = stop_duration
+        self.zones = tuple(zones)
+        self.group = group
+
+    @classmethod
+    def create(cls, time_str, days=None, stop_duration=0, zones=None, group=None):
+        """Build a record from the 'HH:MM' / day-name form used by the UI and settings."""
+        return cls(parse_time(time_str), parse_days(days), int(stop_duration or 0), zones or (), group or None)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls.create(data['time'], data.get('days'), data.get('stop_duration', 0), data.get('zones'),
+                          data.get('group'))
+
+    def to_dict(self):
+        data = {
+            'time': self.time,
+            'days': self.day_names(),
+            'stop_duration': self.stop_duration,
+            'zones': list(self.zones)
+        }
+        if self.group:
+            data['group'] = self.group
+        return data
+
+    @classmethod
+    def from_tuple(cls, data):
+        """Inverse of to_tuple()."""
+        return cls(*data)
+
+    def to_tuple(self):
+        """Compact (minute, days, stop_duration, zones, group) form for fast storage."""
+        return (self.minute, self.days, self.stop_duration, self.zones, self.group)
+
+    @property
+    def time(self):
+        return f"{self.minute // 60:02d}:{self.minute % 60:02d}"
+
+    def weekdays(self):
+        """Return the weekdays (Monday == 0) the schedule fires on."""
+        return [weekday for weekday in range(7) if self.days >> weekday & 1]
+
+    def day_names(self, names=DAY_NAMES):
+        return [names[weekday] for weekday in self.weekdays()]
+
+    def minutes_of_week(self):
+        """Return the minutes-of-week at which the schedule fires."""
+        return [weekday * MINUTES_PER_DAY + self.minute for weekday in self.weekdays()]
+
+    def __eq__(self, other):
+        if not isinstance(other, ScheduleRecord):
+            return NotImplemented
+        return self.to_tuple() == other.to_tuple()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"ScheduleRecord(time={self.time!r}, days={self.day_names()!r}, "
+                f"stop_duration={self.stop_duration!r}, zones={list(self.zones)!r}, group={self.group!r})")
+
+
+class WeeklyTimeline:
+    """
+    Schedules compiled into weekly slots keyed by minute-of-week.
+
+    Minute-of-week is weekday * 1440 + minute-of-day, with Monday 00:00 == 0.
+    Looking up what fires in a given minute is a single dict access, and
+    adding or removing a schedule only touches the slots it occupies.
+    """
+
+    def __init__(self):
+        self._slots = {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def add(self, minute_of_week, record):
+        """Add a schedule to a slot. Returns True if the slot was previously empty."""
+        slot = self._slots.get(minute_of_week)
+        if slot is None:
+            self._slots[minute_of_week] = [record]
+            return True
+        slot.append(record)
+        return False
+
+    def remove(self, minute_of_week, record):
+        """Remove a schedule from a slot. Returns True if the slot is now empty."""
+        slot = self._slots.get(minute_of_week)
+        if slot is None:
+            return False
+        for i, entry in enumerate(slot):
+            if entry is record:
+                del slot[i]
+                break
+        if not slot:
+            del self._slots[minute_of_week]
+            return True
+        return False
+
+    def at(self, minute_of_week):
+        """Return the schedules firing in the given minute-of-week."""
+        return self._slots.get(minute_of_week, ())
+
+    def minutes(self):
+        """Return the occupied minutes-of-week."""
+        return self._slots.keys()
+
+    def clear(self):
+        self._slots = {}
+
+
+def next_occurrence(minute_of_week, after):
+    """Return the first datetime strictly after `after` that falls on minute_of_week."""
+    weekday, minute_of_day = divmod(minute_of_week, MINUTES_PER_DAY)
+    candidate = after.replace(hour=minute_of_day // 60, minute=minute_of_day % 60,
+                              second=0, microsecond=0)
+    candidate += timedelta(days=(weekday - after.weekday()) % 7)
+    if candidate <= after:
+        candidate += timedelta(days=7)
+    return candidate
+
 
 class MusicScheduler:
-    def __init__(self, music_player):
+    def __init__(self, music_player, clock=None, catch_up_seconds=CATCH_UP_SECONDS, zone_players=None,
+                 calendar=None):
+        """
+        :param music_player: Player whose shuffle_and_play() is called on each fire
+        :param clock: Clock to read time and arm timers on (defaults to the system clock)
+        :param catch_up_seconds: Fires that are at most this late still play; later ones are skipped
+        :param zone_players: Optional mapping of zone name -> player for schedules that target zones
+        :param calendar: Optional ExceptionCalendar of holidays that skip or replace schedules
+        """
         self.music_player = music_player
-        self.schedules = []
+        self.zone_players = zone_players or {}
+        self.clock = clock or system_clock
+        self.catch_up_seconds = catch_up_seconds
+        self.calendar = calendar
         self.running = False
-        self._scheduler_thread = None
 
-    def add_schedule(self, time_str, days=None, stop_duration=0):
+        # Private job registry: job id -> schedule, in insertion order
+        self._jobs = {}
+        self._job_ids = itertools.count(1)
+
+        # Schedules indexed by the minutes-of-week they fire in
+        self._timeline = WeeklyTimeline()
+
+        # Min-heap of (fire_at, minute_of_week) entries, one per occupied slot.
+        # Entries are invalidated lazily: an entry is only live while
+        # _slot_fire still maps its slot to the same fire instant.
+        self._heap = []
+        self._slot_fire = {}
+        self._lock = threading.RLock()
+
+        # Clock timer armed for the earliest fire instant
+        self._timer = None
+
+        # Wall time minus monotonic time at the last wake-up; a change means
+        # the wall clock was stepped or the host was suspended
+        self._clock_offset = None
+
+        # Number of times the scheduler was woken by its timer (for diagnostics)
+        self.wakeups = 0
+        self.stats = {
+            'fires': 0,
+            'late_fires': 0,
+            'missed_fires': 0,
+            'excepted_fires': 0,
+            'clock_jumps': 0,
+            'max_latency': 0.0,
+        }
+
+    def add_schedule(self, time_str, days=None, stop_duration=0, zones=None, group=None):
         """
         Add a new schedule for music playback.
-        
+
+        The schedule takes effect immediately, even while the scheduler is
+        running; there is no need to stop and restart it.
+
         :param time_str: Time in format 'HH:MM'
-        :param days: List of days to play music (e.g., ['Monday', 'Wednesday'])
+        :param days: List of days to play music, in English or Hebrew (e.g., ['Monday', 'שני'])
         :param stop_duration: Duration to play music in minutes (0 means play indefinitely)
+        :param zones: Zone names to play in (empty means the default player)
+        :param group: Exception group; grouped schedules only play on dates a calendar exception assigns to them
+        :return: Job id that can be passed to remove_job() or update_job()
         """
-        schedule_info = {
-            'time': time_str,
-            'days': days or [],
-            'stop_duration': stop_duration
-        }
-        self.schedules.append(schedule_info)
-
-    def _job(self):
-        """Internal job to play music at scheduled times."""
-        current_day = datetime.now().strftime('%A')
-        current_time = datetime.now().strftime('%H:%M')
-        
-        print(f"SCHEDULER: Checking schedules - Current day: {current_day}, Current time: {current_time}")
-        print(f"SCHEDULER: Total schedules: {len(self.schedules)}")
-        
-        for schedule_info in self.schedules:
-            print(f"SCHEDULER: Checking schedule: {schedule_info}")
-            
-            # Exact time match and day match
-            time_match = schedule_info['time'] == current_time
-            day_match = not schedule_info['days'] or current_day in schedule_info['days']
-            
-            print(f"SCHEDULER: Time match: {time_match}, Day match: {day_match}")
-            
-            if time_match and day_match:
-                print(f"SCHEDULER: Playing music for schedule: {schedule_info}")
+        return self.add_record(ScheduleRecord.create(time_str, days, stop_duration, zones, group))
+
+    def add_record(self, record):
+        """Add a ScheduleRecord. Returns its job id."""
+        minutes = record.minutes_of_week()
+        with self._lock:
+            job_id = next(self._job_ids)
+            self._jobs[job_id] = record
+            self._insert(record, minutes)
+            return job_id
+
+    def add_records(self, records):
+        """Add many ScheduleRecords at once, re-arming the timer only once. Returns their job ids."""
+        with self._lock:
+            now = self.clock.now()
+            job_ids = []
+            for record in records:
+                job_id = next(self._job_ids)
+                self._jobs[job_id] = record
+                self._add_slots(record, record.minutes_of_week(), now)
+                job_ids.append(job_id)
+            self._arm()
+            return job_ids
+
+    def _insert(self, record, minutes):
+        """Add a schedule's slots to the timeline. Caller must hold the lock."""
+        self._add_slots(record, minutes, self.clock.now())
+        # Re-arm in case this is the new earliest fire
+        self._arm()
+
+    def _add_slots(self, record, minutes, now):
+        for minute_of_week in minutes:
+            if self._timeline.add(minute_of_week, record) and self.running:
+                self._push(minute_of_week, now)
+
+    def _discard(self, record):
+        """Remove a schedule's slots from the timeline. Caller must hold the lock."""
+        for minute_of_week in record.minutes_of_week():
+            if self._timeline.remove(minute_of_week, record):
+                # Last schedule in the slot: its heap entry is now stale
+                self._slot_fire.pop(minute_of_week, None)
+        # Re-arm in case the earliest fire went away
+        self._arm()
+
+    def _push(self, minute_of_week, after):
+        """Queue the next fire instant of a slot. Caller must hold the lock."""
+        fire_at = next_occurrence(minute_of_week, after)
+        self._slot_fire[minute_of_week] = fire_at
+        heapq.heappush(self._heap, (fire_at, minute_of_week))
+
+    def _is_live(self, entry):
+        """Check whether a heap entry still reflects its slot's next fire."""
+        return self._slot_fire.get(entry[1]) == entry[0]
+
+    def _pop_due(self, now):
+        """
+        Pop every schedule due at `now` and requeue the slots' next occurrence.
+
+        Slots more than catch_up_seconds late (host suspended, clock stepped
+        forward) are skipped and counted as missed instead of firing late.
+        """
+        due = []
+        now_ts = self.clock.time()
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._is_live(entry):
+                continue
+            fire_at, minute_of_week = entry
+            schedules = self._for_date(self._timeline.at(minute_of_week), fire_at)
+
+            # Lateness in real seconds, so DST transitions do not count as late
+            lateness = max(0.0, now_ts - fire_at.timestamp())
+            if lateness > self.catch_up_seconds:
+                self.stats['missed_fires'] += len(schedules)
+                log.warning("Skipping %d schedule(s) due at %s, %.0fs late", len(schedules), fire_at, lateness)
+                self.clock.record('missed', time=f"{fire_at:%H:%M}", late=round(lateness))
+            else:
+                self.stats['fires'] += len(schedules)
+                if lateness > LATE_FIRE_SECONDS:
+                    self.stats['late_fires'] += len(schedules)
+                self.stats['max_latency'] = max(self.stats['max_latency'], lateness)
+                due.extend(schedules)
+
+            # Requeue from `now` so a late wake-up fires each slot only once
+            self._push(minute_of_week, max(fire_at, now))
+        return due
+
+    def _for_date(self, schedules, fire_at):
+        """Keep the schedules the exception calendar lets play on fire_at's date."""
+        group = self.calendar.active_group(fire_at.date()) if self.calendar is not None else None
+        if group is None:
+            # Regular day: every schedule without a group
+            return [record for record in schedules if record.group is None]
+
+        excepted = sum(1 for record in schedules if record.group is None)
+        if excepted:
+            self.stats['excepted_fires'] += excepted
+            log.debug("Calendar exception on %s holds back %d schedule(s)", fire_at.date(), excepted)
+        if group == SKIP:
+            return []
+        return [record for record in schedules if record.group == group]
+
+    def set_zone_players(self, zone_players):
+        """Swap the zone name -> player mapping; used from the next fire on."""
+        with self._lock:
+            self.zone_players = zone_players or {}
+
+    def set_calendar(self, calendar):
+        """
+        Swap the exception calendar. It is consulted at fire time, so the
+        schedules and their queued fires are left untouched.
+        """
+        with self._lock:
+            self.calendar = calendar
+
+    def _check_clock(self):
+        """Detect wall-clock steps and suspends by comparing wall and monotonic time."""
+        offset = self.clock.time() - self.clock.monotonic()
+        if self._clock_offset is not None:
+            jump = offset - self._clock_offset
+            if abs(jump) > CLOCK_JUMP_SECONDS:
+                self.stats['clock_jumps'] += 1
+                log.warning("Wall clock jumped by %+.0fs", jump)
+                self.clock.record('clock_jump', seconds=round(jump))
+        self._clock_offset = offset
+
+    def _earliest(self):
+        """Return the earliest live heap entry, dropping stale ones, or None."""
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0] if self._heap else None
+
+    def _arm(self):
+        """Point the clock timer at the earliest fire instant. Caller must hold the lock."""
+        entry = self._earliest() if self.running else None
+        if self._timer is not None:
+            if entry is not None and self._timer.when == entry[0]:
+                return
+            self._timer.cancel()
+            self._timer = None
+        if entry is not None:
+            self._timer = self.clock.call_at(entry[0], self._on_timer)
+
+    def next_fire(self):
+        """Return (fire_at, schedules) for the earliest upcoming slot, or None."""
+        with self._lock:
+            entry = self._earliest()
+            if entry is None:
+                return None
+            fire_at, minute_of_week = entry
+            return fire_at, list(self._timeline.at(minute_of_week))
+
+    def _job(self, record):
+        """Internal job to play music for a schedule that is due."""
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Playing music for schedule: %r", record)
+        self.clock.record('fire', time=record.time, stop_duration=record.stop_duration)
+        for player in self._players_for(record):
+            try:
+                # Play music with optional stop duration
+                player.shuffle_and_play(stop_duration=record.stop_duration)
+            except Exception:
+                log.exception("Error playing music for schedule at %s", record.time)
+
+    def _players_for(self, record):
+        """Return the players a schedule targets: its zones, or the default player."""
+        zones = record.zones
+        if not zones:
+            return [self.music_player] if self.music_player is not None else []
+        players = []
+        for zone in zones:
+            player = self.zone_players.get(zone)
+            if player is None:
+                log.warning("Unknown zone '%s'", zone)
+            else:
+                players.append(player)
+        return players
+
+    def _on_timer(self):
+        """Clock callback at the earliest fire instant: fire what is due and re-arm."""
+        with self._lock:
+            self._timer = None
+            if not self.running:
+                return
+            self.wakeups += 1
+            self._check_clock()
+            due = self._pop_due(self.clock.now())
+            self._arm()
+
+        if due:
+            log.info("Firing %d schedule(s)", len(due))
+
+        # Fire outside the lock so a slow player never blocks add/remove
+        for record in due:
+            self._job(record)
+
+        if due:
+            self._prepare_next()
+
+    def _prepare_next(self):
+        """Let the players plan the songs of the next timed fire while nothing is due."""
+        upcoming = self.next_fire()
+        if upcoming is None:
+            return
+        for record in upcoming[1]:
+            if record.stop_duration <= 0:
+                continue
+            for player in self._players_for(record):
+                prepare = getattr(player, 'prepare', None)
+                if prepare is None:
+                    continue
                 try:
-                    # Play music with optional stop duration
-                    self.music_player.shuffle_and_play(stop_duration=schedule_info.get('stop_duration', 0))
-                except Exception as e:
-                    print(f"SCHEDULER: Error playing music: {e}")
+                    prepare(record.stop_duration)
+                except Exception:
+                    log.exception("Error planning songs for schedule at %s", record.time)
 
     def start(self):
-        """Start the scheduler in a separate thread."""
-        if self.running:
-            print("SCHEDULER: Scheduler already running")
-            return
+        """Start the scheduler; fires run on the clock's timer."""
+        with self._lock:
+            if self.running:
+                log.debug("Scheduler already running")
+                return
+
+            log.info("Starting scheduler with %d schedule(s)", len(self._jobs))
+            self.running = True
+
+            self._clock_offset = self.clock.time() - self.clock.monotonic()
 
-        print("SCHEDULER: Starting scheduler")
-        self.running = True
-        
-        def _run_scheduler():
-            # Clear any existing scheduled jobs first
-            schedule.clear()
-            
-            # Schedule jobs for each schedule
-            for schedule_info in self.schedules:
-                print(f"SCHEDULER: Scheduling job for {schedule_info}")
-                schedule.every().day.at(schedule_info['time']).do(self._job)
-
-            while self.running:
-                schedule.run_pending()
-                time.sleep(1)
-
-        self._scheduler_thread = threading.Thread(target=_run_scheduler, daemon=True)
-        self._scheduler_thread.start()
-        print("SCHEDULER: Scheduler thread started")
+            # Queue the next fire instant of every occupied slot
+            now = self.clock.now()
+            self._heap = []
+            self._slot_fire = {}
+            for minute_of_week in self._timeline.minutes():
+                self._push(minute_of_week, now)
+            self._arm()
+
+        self._prepare_next()
 
     def stop(self):
         """Stop the scheduler."""
-        self.running = False
-        if self._scheduler_thread:
-            self._scheduler_thread.join()
-        
-        # Clear all scheduled jobs
-        schedule.clear()
+        with self._lock:
+            self.running = False
+            self._arm()
+
+            # Drop all queued fire instants
+            self._heap = []
+            self._slot_fire = {}
+
+    def get_stats(self):
+        """Return fire counters: fires, late_fires, missed_fires, excepted_fires, clock_jumps, max_latency."""
+        with self._lock:
+            return dict(self.stats)
 
     def get_schedules(self):
-        """Return the list of current schedules."""
-        return self.schedules
+        """Return the list of current schedules as ScheduleRecords."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def get_jobs(self):
+        """Return (job_id, schedule) pairs for the current schedules."""
+        with self._lock:
+            return list(self._jobs.items())
+
+    def update_job(self, job_id, time_str, days=None, stop_duration=0, zones=None, group=None):
+        """Replace the schedule registered under job_id in place."""
+        record = ScheduleRecord.create(time_str, days, stop_duration, zones, group)
+        minutes = record.minutes_of_week()
+
+        with self._lock:
+            old_info = self._jobs.get(job_id)
+            if old_info is None:
+                raise KeyError(f"No schedule with job id {job_id}")
+            self._discard(old_info)
+            self._jobs[job_id] = record
+            self._insert(record, minutes)
+
+    def remove_job(self, job_id):
+        """Remove a schedule by its job id. Returns True if it existed."""
+        with self._lock:
+            record = self._jobs.pop(job_id, None)
+            if record is None:
+                return False
+            self._discard(record)
+            return True
 
     def remove_schedule(self, index):
         """Remove a schedule by its index."""
-        if 0 <= index < len(self.schedules):
-            del self.schedules[index]
+        with self._lock:
+            if 0 <= index < len(self._jobs):
+                job_id = next(itertools.islice(self._jobs, index, None))
+                self.remove_job(job_id)
@@ -0,0 +1,132 @@
+"""
+Settings file access shared by the GUI and the headless service.
+"""
+import copy
+import json
+import os
+import threading
+
+from utils.config import DEFAULT_SETTINGS, EXCEPTIONS_FILE, SETTINGS_FILE, SETTINGS_SAVE_DELAY
+from utils.log import get_logger
+
+log = get_logger('settings')
+
+
+def load_settings(path=SETTINGS_FILE):
+    """
+    Read a settings file, with defaults for anything it leaves out.
+
+    A missing file gives the defaults; a corrupt one raises ValueError
+    (json.JSONDecodeError).
+    """
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+    except FileNotFoundError:
+        log.info("No settings file at %s, using defaults", path)
+    return settings
+
+
+def schedule_records(settings):
+    """Return the ScheduleRecords of the schedules in `settings`, skipping incomplete ones."""
+    from utils.scheduler import ScheduleRecord
+
+    records = []
+    for schedule_info in settings.get('schedules', []):
+        if not schedule_info.get('time'):
+            continue
+        try:
+            records.append(ScheduleRecord.from_dict(schedule_info))
+        except ValueError as e:
+            log.warning("Skipping schedule %r: %s", schedule_info, e)
+    return records
+
+
+def exceptions_file(settings):
+    return settings.get('exceptions_file') or EXCEPTIONS_FILE
+
+
+class SettingsWriter:
+    """
+    Writes a settings file on a background thread.
+
+    save() only hands the settings over, so it never blocks on the disk.
+    Saves within `delay` seconds of each other are written once, with the
+    latest settings; a write whose content matches the file is skipped.
+    The file is replaced atomically (temp file, fsync, rename), so a crash
+    mid-write leaves the previous settings intact.
+    """
+
+    def __init__(self, path=SETTINGS_FILE, delay=SETTINGS_SAVE_DELAY):
+        self.path = path
+        self.delay = delay
+        self.writes = 0
+        self._pending = None
+        self._closed = False
+        self._flushing = False
+        self._writing = False
+        self._condition = threading.Condition()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._written = f.read()
+        except (OSError, ValueError):
+            self._written = None
+        self._thread = threading.Thread(target=self._run, name="settings-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, settings):
+        """Queue `settings` (a dict the caller won't change afterwards) to be written."""
+        with self._condition:
+            self._pending = settings
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Write any queued settings now and wait until they are on disk."""
+        with self._condition:
+            self._flushing = True
+            self._condition.notify_all()
+            done = self._condition.wait_for(lambda: self._pending is None and not self._writing, timeout)
+            self._flushing = False
+            return done
+
+    def close(self, timeout=5.0):
+        """Write any queued settings and stop the writer thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or self._closed)
+                if self._pending is None:
+                    return
+                # Let a burst of changes (a slider being dragged) settle
+                self._condition.wait_for(lambda: self._closed or self._flushing, self.delay)
+                settings, self._pending = self._pending, None
+                self._writing = True
+
+            try:
+                self._write(settings)
+            except (OSError, TypeError, ValueError):
+                log.exception("Failed to save settings to %s", self.path)
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    def _write(self, settings):
+        data = json.dumps(settings, indent=4, ensure_ascii=False)
+        if data == self._written:
+            return
+        temp_file = self.path + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.path)
+        self._written = data
+        self.writes += 1
+        log.debug("Saved settings to %s", self.path)
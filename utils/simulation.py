@@ -0,0 +1,116 @@
+"""
+Fast-forward simulation of a timetable.
+
+Runs MusicScheduler and MusicPlayer on a SimulatedClock with a simulated
+audio backend, so a week of schedules (including stop durations) replays
+in milliseconds and yields a deterministic event log:
+
+    python -m utils.simulation settings.json --days 7
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+
+from utils.clock import SimulatedClock
+from utils.holidays import ExceptionCalendar
+from utils.music_player import MusicPlayer
+from utils.scheduler import MusicScheduler, ScheduleRecord
+
+
+class SimulatedBackend:
+    """Audio backend that 'plays' each track for a fixed time on a SimulatedClock."""
+
+    def __init__(self, clock, durations=None, default_duration=180.0):
+        self.clock = clock
+        self.durations = durations or {}
+        self.default_duration = default_duration
+        self.volume = None
+        self.on_track_end = None
+        self._end_timer = None
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def play(self, path, volume, duration=None):
+        self.stop()
+        self.volume = volume
+        duration = self.durations.get(path, self.default_duration)
+        self._end_timer = self.clock.call_later(duration, self._track_ended)
+        return self.clock.monotonic()
+
+    def preload(self, path, duration=None, volume=None):
+        pass
+
+    def stop(self):
+        if self._end_timer is not None:
+            self._end_timer.cancel()
+            self._end_timer = None
+
+    def _track_ended(self):
+        self._end_timer = None
+        if self.on_track_end is not None:
+            self.on_track_end(self.clock.monotonic())
+
+
+def simulate(schedules, tracks, days=7, start=None, seed=0, durations=None, default_duration=180.0,
+             calendar=None):
+    """
+    Replay `days` days of schedules and return the clock's event log.
+
+    :param schedules: Iterable of schedule dicts ('time', 'days', 'stop_duration')
+    :param tracks: Track paths to play
+    :param durations: Optional mapping of track path -> length in seconds
+    :param calendar: Optional ExceptionCalendar of holidays
+    :return: List of (datetime, event, details) tuples
+    """
+    clock = SimulatedClock(start)
+    backend = SimulatedBackend(clock, durations, default_duration)
+    player = MusicPlayer(clock=clock, backend=backend, seed=seed,
+                         track_duration=lambda path: backend.durations.get(path, default_duration),
+                         track_gain=lambda path: 1.0)
+    player.set_playlist(tracks)
+
+    scheduler = MusicScheduler(player, clock=clock, calendar=calendar)
+    for schedule_info in schedules:
+        scheduler.add_record(ScheduleRecord.from_dict(schedule_info))
+    scheduler.start()
+    clock.advance(days * 24 * 60 * 60)
+    scheduler.stop()
+    player.stop()
+    return clock.events
+
+
+def format_event(event):
+    """Format an event log entry as a single line."""
+    when, name, details = event
+    fields = ' '.join(f"{key}={value}" for key, value in details.items())
+    return f"{when:%Y-%m-%d %a %H:%M:%S} {name} {fields}".rstrip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fast-forward a timetable and print its event log")
+    parser.add_argument('settings', help="settings JSON file with a 'schedules' list")
+    parser.add_argument('--days', type=int, default=7, help="number of days to simulate")
+    parser.add_argument('--tracks', type=int, default=20, help="number of placeholder tracks")
+    parser.add_argument('--track-length', type=float, default=180.0, help="track length in seconds")
+    parser.add_argument('--seed', type=int, default=0, help="shuffle seed")
+    parser.add_argument('--exceptions', help="exceptions JSON file of holidays to apply")
+    parser.add_argument('--start', help="first simulated day, YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    with open(args.settings, 'r', encoding='utf-8') as f:
+        settings = json.load(f)
+
+    calendar = ExceptionCalendar.load(args.exceptions) if args.exceptions else None
+    start = datetime.strptime(args.start, '%Y-%m-%d') if args.start else None
+
+    tracks = [os.path.join('track', f"{i:03d}.mp3") for i in range(args.tracks)]
+    events = simulate(settings.get('schedules', []), tracks, days=args.days, seed=args.seed,
+                      default_duration=args.track_length, start=start, calendar=calendar)
+    for event in events:
+        print(format_event(event))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Startup phase timing.
+
+main.py marks the end of each startup phase (imports, settings, players,
+UI...). With --profile-startup the app exits once started and prints the
+phases as JSON, which benchmarks/bench_startup.py collects over several
+runs to hold startup under a budget.
+"""
+import json
+import sys
+import time
+
+from utils.log import get_logger
+
+log = get_logger('startup')
+
+# Imported first thing by main.py, so this is close to interpreter start
+_started = time.perf_counter()
+_last = _started
+_phases = []
+
+
+def mark(phase):
+    """Record that `phase` just finished."""
+    global _last
+    now = time.perf_counter()
+    _phases.append((phase, now - _last))
+    _last = now
+
+
+def phases():
+    """Return [(phase, seconds)] in the order they were marked."""
+    return list(_phases)
+
+
+def report(stream=None):
+    """Log the phases and write them, with the total, as JSON to `stream` (stdout by default)."""
+    total = _last - _started
+    for phase, seconds in _phases:
+        log.info("Startup phase %-10s %7.1f ms", phase, seconds * 1000)
+    log.info("Startup took %.1f ms", total * 1000)
+    data = {'phases': [{'phase': phase, 'seconds': seconds} for phase, seconds in _phases],
+            'total': total}
+    stream = stream or sys.stdout
+    stream.write(json.dumps(data) + '\n')
+    stream.flush()
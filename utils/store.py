@@ -0,0 +1,340 @@
+"""
+SQLite store for schedules, settings and calendar exceptions.
+
+An alternative to the JSON settings file for sites with thousands of
+schedules: every schedule is a row, so adding, changing or removing one is
+a single small transaction instead of rewriting the whole file. Each
+schedule's weekdays and zones are kept in indexed side tables, so a
+scheduler can load only the rows it needs (one zone's schedules, only the
+holiday groups that are still ahead):
+
+    store = ScheduleStore('music_scheduler.db')
+    store.import_settings('settings.json')
+    job_ids = store.load_into(scheduler, zones=['hall'])
+
+Import existing JSON files (both the app's settings.json and the legacy
+music_scheduler_settings.json) with:
+
+    python -m utils.store settings.json --exceptions exceptions.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import date
+
+from utils.config import STORE_FILE
+from utils.holidays import CalendarException, ExceptionCalendar
+from utils.log import get_logger, setup_logging
+from utils.scheduler import ScheduleRecord
+
+log = get_logger('store')
+
+SCHEMA_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL                 -- JSON
+);
+CREATE TABLE IF NOT EXISTS schedules (
+    id INTEGER PRIMARY KEY,
+    minute INTEGER NOT NULL,            -- minute of the day
+    days INTEGER NOT NULL,              -- weekday bitmask, bit 0 == Monday
+    stop_duration INTEGER NOT NULL DEFAULT 0,
+    grp TEXT,                           -- exception group, NULL for regular schedules
+    extra TEXT                          -- JSON of fields the scheduler doesn't use
+);
+CREATE INDEX IF NOT EXISTS schedules_grp ON schedules (grp);
+CREATE TABLE IF NOT EXISTS schedule_days (
+    weekday INTEGER NOT NULL,
+    schedule_id INTEGER NOT NULL REFERENCES schedules (id) ON DELETE CASCADE,
+    PRIMARY KEY (weekday, schedule_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS schedule_zones (
+    zone TEXT NOT NULL,
+    schedule_id INTEGER NOT NULL REFERENCES schedules (id) ON DELETE CASCADE,
+    PRIMARY KEY (zone, schedule_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS schedule_zones_schedule ON schedule_zones (schedule_id);
+CREATE TABLE IF NOT EXISTS exceptions (
+    id INTEGER PRIMARY KEY,             -- later rows win where ranges overlap
+    start TEXT NOT NULL,                -- ISO dates, inclusive
+    end TEXT NOT NULL,
+    action TEXT NOT NULL,
+    grp TEXT,
+    name TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS exceptions_end ON exceptions (end);
+'''
+
+# Schedule fields that have columns; anything else in a JSON schedule is kept in `extra`
+SCHEDULE_FIELDS = ('time', 'days', 'stop_duration', 'zones', 'group')
+
+
+class ScheduleStore:
+    """Schedules, settings and exceptions in one SQLite database."""
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        # One connection shared by the UI, scheduler and worker threads
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA foreign_keys = ON')
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode = WAL')
+            self._conn.execute('PRAGMA synchronous = NORMAL')
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            self._conn.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Settings
+
+    def get_setting(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_setting(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                               (key, json.dumps(value, ensure_ascii=False)))
+
+    def settings(self):
+        """Return every stored setting as a dict."""
+        with self._lock:
+            rows = self._conn.execute('SELECT key, value FROM settings').fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    # Schedules
+
+    def _insert_schedule(self, record, extra, schedule_id=None):
+        """Write a schedule row and its days and zones. Caller must hold the lock in a transaction."""
+        cursor = self._conn.execute(
+            'INSERT INTO schedules (id, minute, days, stop_duration, grp, extra) VALUES (?, ?, ?, ?, ?, ?)',
+            (schedule_id, record.minute, record.days, record.stop_duration, record.group,
+             json.dumps(extra, ensure_ascii=False) if extra else None))
+        schedule_id = cursor.lastrowid
+        self._conn.executemany('INSERT INTO schedule_days (weekday, schedule_id) VALUES (?, ?)',
+                               [(weekday, schedule_id) for weekday in record.weekdays()])
+        self._conn.executemany('INSERT OR IGNORE INTO schedule_zones (zone, schedule_id) VALUES (?, ?)',
+                               [(zone, schedule_id) for zone in record.zones])
+        return schedule_id
+
+    def add_schedule(self, record, extra=None):
+        """
+        Store a ScheduleRecord. Returns its schedule id.
+
+        :param extra: Dict of other fields to keep with it (e.g. the legacy app's folder and volume)
+        """
+        with self._lock, self._conn:
+            return self._insert_schedule(record, extra)
+
+    def update_schedule(self, schedule_id, record, extra=None):
+        """Replace one schedule, keeping its id. Raises KeyError if there is none."""
+        with self._lock, self._conn:
+            if self._conn.execute('DELETE FROM schedules WHERE id = ?', (schedule_id,)).rowcount == 0:
+                raise KeyError(f"No schedule with id {schedule_id}")
+            self._insert_schedule(record, extra, schedule_id)
+
+    def remove_schedule(self, schedule_id):
+        """Remove one schedule. Returns True if it existed."""
+        with self._lock, self._conn:
+            return self._conn.execute('DELETE FROM schedules WHERE id = ?', (schedule_id,)).rowcount > 0
+
+    def schedules(self, zones=None, weekdays=None, groups=None):
+        """
+        Return (schedule_id, ScheduleRecord) pairs, in id order.
+
+        :param zones: Only schedules that play in one of these zones, plus
+                      those without zones (which play everywhere)
+        :param weekdays: Only schedules firing on one of these weekdays (Monday == 0)
+        :param groups: Only schedules of these exception groups; None in the
+                       list stands for the regular, ungrouped schedules
+        """
+        where, params = [], []
+        if zones is not None:
+            zones = list(zones)
+            where.append('(id IN (SELECT schedule_id FROM schedule_zones WHERE zone IN (%s))'
+                         ' OR id NOT IN (SELECT schedule_id FROM schedule_zones))' % _placeholders(zones))
+            params.extend(zones)
+        if weekdays is not None:
+            weekdays = list(weekdays)
+            where.append('id IN (SELECT schedule_id FROM schedule_days WHERE weekday IN (%s))'
+                         % _placeholders(weekdays))
+            params.extend(weekdays)
+        if groups is not None:
+            named = [group for group in groups if group is not None]
+            condition = 'grp IN (%s)' % _placeholders(named)
+            if None in groups:
+                condition = '(grp IS NULL OR %s)' % condition
+            where.append(condition)
+            params.extend(named)
+
+        query = 'SELECT id, minute, days, stop_duration, grp FROM schedules'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY id'
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            zones_of = self._zones_of([row[0] for row in rows])
+        return [(schedule_id, ScheduleRecord(minute, days, stop_duration, zones_of.get(schedule_id, ()), group))
+                for schedule_id, minute, days, stop_duration, group in rows]
+
+    def _zones_of(self, schedule_ids):
+        """Map schedule id -> zones for the given ids. Caller must hold the lock."""
+        zones_of = {}
+        # Stay under SQLite's limit on bound parameters
+        for start in range(0, len(schedule_ids), 500):
+            chunk = schedule_ids[start:start + 500]
+            for zone, schedule_id in self._conn.execute(
+                    'SELECT zone, schedule_id FROM schedule_zones WHERE schedule_id IN (%s) ORDER BY zone'
+                    % _placeholders(chunk), chunk):
+                zones_of.setdefault(schedule_id, []).append(zone)
+        return zones_of
+
+    def schedule_extra(self, schedule_id):
+        """Return the extra fields stored with a schedule ({} if none)."""
+        with self._lock:
+            row = self._conn.execute('SELECT extra FROM schedules WHERE id = ?', (schedule_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No schedule with id {schedule_id}")
+        return json.loads(row[0]) if row[0] else {}
+
+    def count_schedules(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM schedules').fetchone()[0]
+
+    # Exceptions
+
+    def add_exception(self, exception):
+        """Store a CalendarException; it wins over the ones stored before it. Returns its id."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                'INSERT INTO exceptions (start, end, action, grp, name) VALUES (?, ?, ?, ?, ?)',
+                (exception.start.isoformat(), exception.end.isoformat(), exception.action,
+                 exception.group, exception.name)).lastrowid
+
+    def remove_exception(self, exception_id):
+        with self._lock, self._conn:
+            return self._conn.execute('DELETE FROM exceptions WHERE id = ?', (exception_id,)).rowcount > 0
+
+    def exceptions(self, since=None):
+        """Return (exception_id, CalendarException) pairs, optionally only those ending on or after `since`."""
+        query = 'SELECT id, start, end, action, grp, name FROM exceptions'
+        params = ()
+        if since is not None:
+            query += ' WHERE end >= ?'
+            params = (since.isoformat(),)
+        with self._lock:
+            rows = self._conn.execute(query + ' ORDER BY id', params).fetchall()
+        return [(exception_id, CalendarException(date.fromisoformat(start), date.fromisoformat(end),
+                                                 action, group, name))
+                for exception_id, start, end, action, group, name in rows]
+
+    def calendar(self, since=None):
+        """Return an ExceptionCalendar of the stored exceptions (those ending on or after `since`)."""
+        return ExceptionCalendar(exception for exception_id, exception in self.exceptions(since))
+
+    # Loading into a scheduler
+
+    def load_into(self, scheduler, zones=None, since=None):
+        """
+        Load the calendar and the schedules a scheduler can still fire.
+
+        Grouped schedules are only loaded when an exception from `since`
+        (default today) on replaces the regular ones with their group; the
+        rest could never play.
+
+        :param zones: Only load schedules for these zones (and those for every zone)
+        :return: Mapping of the scheduler's job ids to schedule ids, for applying later edits to both
+        """
+        calendar = self.calendar(since or date.today())
+        groups = {None}
+        groups.update(exception.group for exception in calendar.exceptions() if exception.group)
+        rows = self.schedules(zones=zones, groups=groups)
+
+        scheduler.set_calendar(calendar)
+        job_ids = scheduler.add_records([record for schedule_id, record in rows])
+        log.info("Loaded %d schedule(s) and %d exception(s) from %s", len(rows), len(calendar), self.path)
+        return dict(zip(job_ids, (schedule_id for schedule_id, record in rows)))
+
+    # JSON import
+
+    def import_settings(self, path, replace=True):
+        """
+        Import a JSON settings file: the app's settings.json or the legacy
+        music_scheduler_settings.json. Returns the number of schedules imported.
+
+        :param replace: Drop the schedules already stored first
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+
+        imported = 0
+        with self._lock, self._conn:
+            if replace:
+                self._conn.execute('DELETE FROM schedules')
+            for schedule_info in settings.get('schedules', []):
+                if not schedule_info.get('time'):
+                    continue
+                try:
+                    record = ScheduleRecord.from_dict(schedule_info)
+                except ValueError as e:
+                    log.warning("Skipping schedule %r: %s", schedule_info, e)
+                    continue
+                extra = {key: value for key, value in schedule_info.items() if key not in SCHEDULE_FIELDS}
+                self._insert_schedule(record, extra)
+                imported += 1
+            for key, value in settings.items():
+                if key != 'schedules':
+                    self._conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                                       (key, json.dumps(value, ensure_ascii=False)))
+        log.info("Imported %d schedule(s) from %s", imported, path)
+        return imported
+
+    def import_exceptions(self, path, replace=True):
+        """Import an exceptions JSON file (see utils.holidays). Returns the number imported."""
+        calendar = ExceptionCalendar.load(path)
+        with self._lock, self._conn:
+            if replace:
+                self._conn.execute('DELETE FROM exceptions')
+            self._conn.executemany(
+                'INSERT INTO exceptions (start, end, action, grp, name) VALUES (?, ?, ?, ?, ?)',
+                [(exception.start.isoformat(), exception.end.isoformat(), exception.action,
+                  exception.group, exception.name) for exception in calendar.exceptions()])
+        log.info("Imported %d exception(s) from %s", len(calendar), path)
+        return len(calendar)
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import JSON settings into the schedule database")
+    parser.add_argument('settings', help="settings.json or music_scheduler_settings.json")
+    parser.add_argument('--exceptions', help="exceptions JSON file to import as well")
+    parser.add_argument('--db', default=STORE_FILE, help="database file (created if missing)")
+    parser.add_argument('--append', action='store_true', help="keep the schedules already in the database")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    store = ScheduleStore(args.db)
+    try:
+        count = store.import_settings(args.settings, replace=not args.append)
+        print(f"{count} schedule(s) imported into {os.path.abspath(args.db)}")
+        if args.exceptions:
+            count = store.import_exceptions(args.exceptions, replace=not args.append)
+            print(f"{count} exception(s) imported")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Multi-zone playback.
+
+Each audio zone gets its own worker process running a MusicPlayer on its
+own mixer and output device. The coordinator, which runs the scheduler,
+sends commands to the workers over a pipe and restarts any worker that
+dies. Zones are configured in the settings file:
+
+    "zones": [
+        {"name": "hall", "device": "Speakers (USB Audio)", "music_folder": "...", "volume": 0.7}
+    ],
+    "schedules": [
+        {"time": "08:00", "days": ["Monday"], "stop_duration": 15, "zones": ["hall"]}
+    ]
+
+Run a headless coordinator for every zone in a settings file with:
+
+    python -m utils.zones settings.json
+"""
+import argparse
+import multiprocessing
+import multiprocessing.connection
+import signal
+import threading
+
+from utils.clock import system_clock
+from utils.config import ZONE_RESTART_DELAY
+from utils.log import get_logger, logging_configured, setup_logging
+
+log = get_logger('zones')
+
+
+def _zone_worker(conn, zone):
+    """Worker process entry point: run one zone's player until told to shut down."""
+    # The coordinator handles Ctrl+C and shuts workers down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # A forked worker inherits the coordinator's handlers; a spawned one starts with none
+    if not logging_configured():
+        setup_logging()
+
+    from utils.audio_backend import PygameBackend
+    from utils.music_player import MusicPlayer
+
+    player = MusicPlayer(volume=zone.get('volume', 0.7),
+                         backend=PygameBackend(device=zone.get('device')))
+    player.set_volume(player.volume)
+    if zone.get('music_folder'):
+        try:
+            player.load_playlist(zone['music_folder'])
+        except ValueError as e:
+            log.error("Zone '%s': %s", zone['name'], e)
+
+    commands = {
+        'shuffle_and_play': player.shuffle_and_play,
+        'stop': player.stop,
+        'prepare': player.prepare,
+        'set_volume': player.set_volume,
+        'load_playlist': player.load_playlist,
+    }
+
+    # Block on the pipe; the worker does nothing between commands
+    while True:
+        try:
+            command, kwargs = conn.recv()
+        except EOFError:
+            break
+        if command == 'shutdown':
+            break
+        try:
+            commands[command](**kwargs)
+        except Exception:
+            log.exception("Zone '%s': Error running %s", zone['name'], command)
+
+    player.stop()
+
+
+class ZoneWorker:
+    """Coordinator-side handle of one zone's worker process."""
+
+    def __init__(self, zone):
+        self.zone = zone
+        self.name = zone['name']
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+
+    def start(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_zone_worker, args=(child_conn, self.zone),
+                                               name=f"zone-{self.name}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def send(self, command, **kwargs):
+        self.conn.send((command, kwargs))
+
+    def shutdown(self, timeout=2.0):
+        if self.process is None:
+            return
+        try:
+            self.send('shutdown')
+        except (OSError, EOFError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+        self.process = None
+
+
+class ZonePlayer:
+    """MusicPlayer-like proxy that forwards commands to one or more zones."""
+
+    def __init__(self, coordinator, zones):
+        self.coordinator = coordinator
+        self.zones = list(zones)
+
+    def shuffle_and_play(self, stop_duration=0):
+        for zone in self.zones:
+            self.coordinator.dispatch(zone, 'shuffle_and_play', stop_duration=stop_duration)
+
+    def stop(self):
+        for zone in self.zones:
+            self.coordinator.dispatch(zone, 'stop')
+
+    def prepare(self, stop_duration):
+        for zone in self.zones:
+            self.coordinator.dispatch(zone, 'prepare', stop_duration=stop_duration)
+
+    def set_volume(self, volume):
+        for zone in self.zones:
+            self.coordinator.dispatch(zone, 'set_volume', volume=volume)
+
+    def load_playlist(self, music_folder):
+        for zone in self.zones:
+            self.coordinator.dispatch(zone, 'load_playlist', music_folder=music_folder)
+
+
+class ZoneCoordinator:
+    """
+    Owns the zone worker processes.
+
+    A supervisor thread blocks on the workers' process sentinels and
+    restarts any worker that exits unexpectedly after ZONE_RESTART_DELAY.
+    """
+
+    def __init__(self, zones, clock=None, restart_delay=ZONE_RESTART_DELAY):
+        self.clock = clock or system_clock
+        self.restart_delay = restart_delay
+        self.workers = {zone['name']: ZoneWorker(zone) for zone in zones}
+        self.running = False
+        self._lock = threading.RLock()
+        self._supervisor_thread = None
+        self._wakeup_r, self._wakeup_w = multiprocessing.Pipe(duplex=False)
+
+    def player(self, zone):
+        """Return a player proxy for one zone."""
+        return ZonePlayer(self, [zone])
+
+    def players(self):
+        """Return a zone name -> player proxy mapping for MusicScheduler."""
+        return {name: self.player(name) for name in self.workers}
+
+    def all_zones_player(self):
+        """Return a player proxy that drives every zone at once."""
+        return ZonePlayer(self, self.workers)
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            for worker in self.workers.values():
+                worker.start()
+        self._supervisor_thread = threading.Thread(target=self._supervise, name="zone-supervisor", daemon=True)
+        self._supervisor_thread.start()
+
+    def stop(self):
+        with self._lock:
+            self.running = False
+            self._wakeup_w.send(None)
+            for worker in self.workers.values():
+                worker.shutdown()
+        if self._supervisor_thread is not None:
+            self._supervisor_thread.join()
+            self._supervisor_thread = None
+
+    def dispatch(self, zone, command, **kwargs):
+        """Send a command to a zone's worker, restarting the worker if it is dead."""
+        with self._lock:
+            worker = self.workers.get(zone)
+            if worker is None:
+                raise KeyError(f"Unknown zone '{zone}'")
+            if not self.running:
+                log.warning("Coordinator stopped, dropping '%s' for zone '%s'", command, zone)
+                return
+            if not worker.is_alive():
+                self._restart(worker)
+            try:
+                worker.send(command, **kwargs)
+            except (OSError, EOFError):
+                # The worker died between the check and the send
+                self._restart(worker)
+                worker.send(command, **kwargs)
+
+    def _restart(self, worker):
+        """Replace a dead worker process. Caller must hold the lock."""
+        if not self.running:
+            return
+        worker.restarts += 1
+        log.warning("Restarting worker for zone '%s' (restart #%d)", worker.name, worker.restarts)
+        if worker.conn is not None:
+            worker.conn.close()
+        worker.start()
+        # Make the supervisor watch the new process
+        self._wakeup_w.send(None)
+
+    def _restart_if_dead(self, worker):
+        with self._lock:
+            if self.running and not worker.is_alive():
+                self._restart(worker)
+
+    def _supervise(self):
+        """Block until a worker exits, then schedule its restart."""
+        while True:
+            with self._lock:
+                if not self.running:
+                    return
+                sentinels = {worker.process.sentinel: worker
+                             for worker in self.workers.values() if worker.process is not None}
+
+            ready = multiprocessing.connection.wait(list(sentinels) + [self._wakeup_r])
+            for item in ready:
+                if item is self._wakeup_r:
+                    self._wakeup_r.recv()
+                    continue
+                worker = sentinels[item]
+                with self._lock:
+                    if not self.running or worker.is_alive():
+                        continue
+                    # Reap the process so its sentinel stops being ready
+                    worker.process.join()
+                    worker.process = None
+                log.error("Worker for zone '%s' exited", worker.name)
+                self.clock.call_later(self.restart_delay, lambda worker=worker: self._restart_if_dead(worker))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the scheduler for every configured zone")
+    parser.add_argument('settings', help="settings JSON file with 'zones' and 'schedules'")
+    parser.add_argument('--debug', action='store_true', help="log per-schedule and per-track detail")
+    args = parser.parse_args(argv)
+    setup_logging(debug=args.debug)
+
+    # Same service as `main.py --headless`, which also handles sites without zones
+    from utils.daemon import run
+    run(args.settings)
+
+
+if __name__ == "__main__":
+    main()